@@ -0,0 +1,34 @@
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from core.database.analytics_db import PLATFORM_KINDS, platformHourlyRollups
+from core.utlis.responses import JSONResponse
+from core.utlis.validation import iso_param
+from config import Config
+
+analytics_router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+def requireOps(request: Request):
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if not Config.OPS_TOKEN or scheme.lower() != "bearer" or not hmac.compare_digest(token, Config.OPS_TOKEN):
+        raise HTTPException(status_code=403, detail="Operator token required")
+
+
+@analytics_router.get("/platform/hourly", dependencies=[Depends(requireOps)])
+async def platform_hourly(since: str | None = None,
+                          until: str | None = None,
+                          limit: int = Query(168, ge=1, le=24 * 92)):
+    try:
+        since, until = iso_param(since, "since"), iso_param(until, "until")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    hours = await platformHourlyRollups(since=since, until=until, limit=limit)
+    empty = {"count": 0, "amount": 0.0}
+    return JSONResponse({
+        "hours": [{
+            "hour": hour["hour"],
+            "transactions": hour["transactions"],
+            "volume": hour["volume"],
+            **{kind: {**empty, **hour.get(kind, {})} for kind in PLATFORM_KINDS}
+        } for hour in hours]
+    }, status_code=200)
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Request, HTTPException
-from starlette.responses import JSONResponse
+from core.utlis.responses import JSONResponse
 
 from core.utlis.jwt_gen import create_access_token
 from core.database.user_db import RegisterUser, LoginUser
@@ -7,12 +7,15 @@ from core.models.models import RegisterManager, LoginManager, Token
 from core.utlis.security import hash_password, check_password
 from core.utlis.validation import validatePass
 from core.utlis.limiter import limiter
+from core.utlis.error import PasswordPoolBusyError
 from config import Config
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+busyError = HTTPException(status_code=503, detail="Server is busy, please retry", headers={"Retry-After": "1"})
 
-@router.post("/login")
+
+@router.post("/login", response_model=Token)
 @limiter.limit("5/minute")
 async def login_user(request: Request, login: LoginManager):
     check_username = login.username.lower()
@@ -23,12 +26,15 @@ async def login_user(request: Request, login: LoginManager):
     if not user:
         raise invalid_passError
 
-    valid_password = await check_password(login.password, user.hashed_password)
+    try:
+        valid_password = await check_password(login.password, user.hashed_password)
+    except PasswordPoolBusyError:
+        raise busyError
     if not valid_password:
         raise invalid_passError
 
     jwt_token = create_access_token({"sub": user.username, "user_id": user.id})
-    return Token(access_token=jwt_token, token_type="bearer" ,  expires_in=Config.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    return JSONResponse(Token(access_token=jwt_token, token_type="bearer" ,  expires_in=Config.ACCESS_TOKEN_EXPIRE_MINUTES * 60))
 
 
 @router.post("/register")
@@ -38,7 +44,10 @@ async def register_user(request: Request, register: RegisterManager):
     if not valid:
         raise HTTPException(status_code=400, detail=details["message"])
 
-    hashed_password = await hash_password(register.password)
+    try:
+        hashed_password = await hash_password(register.password)
+    except PasswordPoolBusyError:
+        raise busyError
     result = await RegisterUser(
         phoneNumber=register.phoneNumber,
         username=register.username.lower(),
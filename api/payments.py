@@ -1,20 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse, RedirectResponse
+from fastapi.responses import StreamingResponse, RedirectResponse, Response
 from typing import Annotated
-import qrcode
-import io
+import asyncio
+import logging
 import uuid
-from core.database.reqs_db import findTransactionRequests, updateTransactionRequest, transactionRequest
-from core.database.transaction_db import GetUserByWalletId, UpdateUserBalanceByWalletId, addTransaction
+import orjson
+from core.database.reqs_db import findTransactionRequests, transitionTransactionRequest, transactionRequest
+from core.database.transaction_db import transferFunds
 from core.models.models import UserInDB, QRPaymentRequest, QRPaymentResponse, PaymentConfirmationData, PaymentAction
 from datetime import datetime, timedelta, timezone
 from core.utlis.getCurrUser import getUser
 from core.utlis.limiter import limiter
+from core.utlis.error import TransactionNotFoundError, TransactionStateConflictError, ValidationError
+from core.utlis.broker import get_broker, InMemoryBroker
+from core.utlis.qr import qr_cache, qr_etag, QR_MEDIA_TYPES
+from core.utlis.responses import JSONResponse
+from config import Config
 
 pay_router = APIRouter(prefix="/payments", tags=["payments"])
 
+logger = logging.getLogger("raxwallet.payments")
 
-@pay_router.post("/create_qr_request")
+TERMINAL_STATUSES = {"completed", "rejected", "cancelled", "expired", "failed"}
+
+
+def _statusPayload(request_id: str, req: dict) -> dict:
+    return {
+        "request_id": request_id,
+        "status": req.get("status"),
+        "amount": float(req.get("amount", 0)),
+        "receiver_name": req.get("recipient_username"),
+        "sender_name": req.get("sender_username", ""),
+        "created_at": req.get("created_at")
+    }
+
+
+@pay_router.post("/create_qr_request", response_model=QRPaymentResponse)
 @limiter.limit("10/minute")
 async def createQRPaymentRequest(request: Request, qr_request: QRPaymentRequest,
                                  curr: Annotated[UserInDB, Depends(getUser)]):
@@ -32,7 +53,9 @@ async def createQRPaymentRequest(request: Request, qr_request: QRPaymentRequest,
             amount=str(qr_request.amount),
             status="pending",
             sender_wallet_id="",
-            sender_username=""
+            sender_username="",
+            expires_at=expires_at.isoformat(),
+            description=qr_request.description
         )
 
         if not data:
@@ -43,42 +66,50 @@ async def createQRPaymentRequest(request: Request, qr_request: QRPaymentRequest,
 
     qr_code_url = f"http://{request.url.netloc}/payments/qr_code/{request_id}"
 
-    return QRPaymentResponse(
+    return JSONResponse(QRPaymentResponse(
         request_id=request_id,
         qr_code_url=qr_code_url,
         amount=qr_request.amount,
         receiver_name=curr.full_name,
         expires_at=expires_at.isoformat()
-    )
+    ))
 
 
 @pay_router.get("/qr_code/{request_id}")
-async def getQRCode(request: Request, request_id: str):
-    try:
-        req = await findTransactionRequests(request_id=request_id, wallet_id="")
-        if req is None:
-            raise HTTPException(status_code=404, detail="Payment request not found")
+async def getQRCode(request: Request, request_id: str, format: str = "png"):
+    if format not in QR_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(QR_MEDIA_TYPES)}")
+
+    req = await findTransactionRequests(request_id=request_id, wallet_id="")
+    if req is None:
+        raise HTTPException(status_code=404, detail="Payment request not found")
 
-        if req.get("status") != "pending":
-            raise HTTPException(status_code=400, detail="Payment request is no longer active")
+    if req.get("status") != "pending":
+        raise HTTPException(status_code=400, detail="Payment request is no longer active")
 
-        payment_url = f"http://{request.url.netloc}/payments/scan?request_id={request_id}"
-        img = qrcode.make(payment_url)
-        buf = io.BytesIO()
-        img.save(buf, "PNG")
-        buf.seek(0)
+    host = request.url.netloc
+    headers = {
+        "ETag": qr_etag(request_id, host, format),
+        "Cache-Control": "public, max-age=300, must-revalidate"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
 
-        return StreamingResponse(buf, media_type="image/png")
+    try:
+        payment_url = f"http://{host}/payments/scan?request_id={request_id}"
+        image = await qr_cache.get(request_id, host, format, payment_url)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate QR code: {str(e)}")
 
+    return Response(image, media_type=QR_MEDIA_TYPES[format], headers=headers)
+
 
 @pay_router.get("/scan")
 async def handleQRScan(request: Request, request_id: str):
     return RedirectResponse(url=f"/payment-confirmation?request_id={request_id}")
 
 
-@pay_router.get("/confirmation_data/{request_id}")
+@pay_router.get("/confirmation_data/{request_id}", response_model=PaymentConfirmationData)
 async def getPaymentConfirmationData(request_id: str, curr: Annotated[UserInDB, Depends(getUser)]):
     if not request_id:
         raise HTTPException(status_code=400, detail="Missing request_id")
@@ -94,14 +125,14 @@ async def getPaymentConfirmationData(request_id: str, curr: Annotated[UserInDB,
     if curr.balance < amount:
         raise HTTPException(status_code=400, detail="Insufficient funds in your wallet")
 
-    return PaymentConfirmationData(
+    return JSONResponse(PaymentConfirmationData(
         request_id=request_id,
         receiver_name=req.get("recipient_username", "Unknown"),
         receiver_wallet_id=req.get("recipient_id"),
         amount=amount,
         description=req.get("description", ""),
         transaction_id=request_id
-    )
+    ))
 
 
 @pay_router.post("/process_action")
@@ -112,21 +143,20 @@ async def processPaymentAction(action: PaymentAction, curr: Annotated[UserInDB,
     if action.action not in ["accept", "reject"]:
         raise HTTPException(status_code=400, detail="Action must be 'accept' or 'reject'")
 
-    req = await findTransactionRequests(request_id=action.request_id, wallet_id="")
-    if req is None:
-        raise HTTPException(status_code=404, detail="Payment request not found")
-
-    if req.get("status") != "pending":
-        raise HTTPException(status_code=400, detail="Payment request is no longer active")
-
-    if action.action == "reject":
-        await updateTransactionRequest(
+    try:
+        req = await transitionTransactionRequest(
             request_id=action.request_id,
-            wallet_id=req["recipient_id"],
-            status="rejected",
+            from_status="pending",
+            to_status="rejected" if action.action == "reject" else "processing",
             sender_wallet_id=curr.wallet_id,
             sender_username=curr.username
         )
+    except TransactionNotFoundError:
+        raise HTTPException(status_code=404, detail="Payment request not found")
+    except TransactionStateConflictError:
+        raise HTTPException(status_code=400, detail="Payment request is no longer active")
+
+    if action.action == "reject":
         return JSONResponse({
             "status": "success",
             "message": "Payment request rejected",
@@ -134,67 +164,85 @@ async def processPaymentAction(action: PaymentAction, curr: Annotated[UserInDB,
         })
 
     amount = float(req["amount"])
+    # the sweeper may have parked a slow payment in review; this worker still owns its outcome
+    claimed = ["processing", "review"]
 
-    if curr.balance < amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds in your wallet")
+    try:
+        result = await transferFunds(curr.wallet_id, req["recipient_id"], amount, tx_id=action.request_id)
+    except ValidationError as e:
+        await transitionTransactionRequest(action.request_id, claimed, "pending", sender_wallet_id="", sender_username="")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        await transitionTransactionRequest(action.request_id, claimed, "failed")
+        raise HTTPException(status_code=500, detail=f"Failed to process payment: {str(e)}")
 
-    receiver = await GetUserByWalletId(req.get("recipient_id"))
-    if receiver is None:
+    if result == "insufficient":
+        await transitionTransactionRequest(action.request_id, claimed, "pending", sender_wallet_id="", sender_username="")
+        raise HTTPException(status_code=400, detail="Insufficient funds in your wallet")
+    if result == "recipient":
+        await transitionTransactionRequest(action.request_id, claimed, "failed")
         raise HTTPException(status_code=404, detail="Receiver wallet not found")
+    sender, receiver = result
 
     try:
-        new_sender_balance = curr.balance - amount
-        new_receiver_balance = receiver.balance + amount
+        await transitionTransactionRequest(action.request_id, claimed, "completed")
+    except Exception:
+        # The money has moved; the expiry sweeper completes the request from its ledger entry.
+        logger.exception("Error completing payment request %s", action.request_id)
 
-        success_sender = await UpdateUserBalanceByWalletId(curr.wallet_id, new_sender_balance)
-        success_receiver = await UpdateUserBalanceByWalletId(receiver.wallet_id, new_receiver_balance)
-
-        if not success_sender or not success_receiver:
-            raise HTTPException(status_code=500, detail="Failed to complete transaction")
+    return JSONResponse({
+        "status": "success",
+        "message": "Payment processed successfully",
+        "action": "accepted",
+        "amount": amount,
+        "receiver_name": receiver["full_name"],
+        "new_balance": sender["balance"]
+    })
 
-        await addTransaction(curr.wallet_id, -amount, "debit", new_sender_balance)
-        await addTransaction(receiver.wallet_id, amount, "credit", new_receiver_balance)
 
-        await updateTransactionRequest(
-            request_id=action.request_id,
-            wallet_id=req["recipient_id"],
-            status="completed",
-            sender_wallet_id=curr.wallet_id,
-            sender_username=curr.username
-        )
-
-        return JSONResponse({
-            "status": "success",
-            "message": "Payment processed successfully",
-            "action": "accepted",
-            "amount": amount,
-            "receiver_name": receiver.full_name,
-            "new_balance": new_sender_balance
-        })
+@pay_router.get("/request_status/{request_id}")
+async def getRequestStatus(request_id: str):
+    req = await findTransactionRequests(request_id=request_id, wallet_id="")
+    if req is None:
+        raise HTTPException(status_code=404, detail="Payment request not found")
 
-    except Exception as e:
-        await updateTransactionRequest(
-            request_id=action.request_id,
-            wallet_id=req["recipient_id"],
-            status="failed"
-        )
-        raise HTTPException(status_code=500, detail=f"Failed to process payment: {str(e)}")
+    return JSONResponse(_statusPayload(request_id, req))
 
 
-@pay_router.get("/request_status/{request_id}")
-async def getRequestStatus(request_id: str):
+@pay_router.get("/request_events/{request_id}")
+async def streamRequestStatus(request: Request, request_id: str):
     req = await findTransactionRequests(request_id=request_id, wallet_id="")
     if req is None:
         raise HTTPException(status_code=404, detail="Payment request not found")
 
-    return JSONResponse({
-        "request_id": request_id,
-        "status": req.get("status"),
-        "amount": float(req.get("amount", 0)),
-        "receiver_name": req.get("recipient_username"),
-        "sender_name": req.get("sender_username", ""),
-        "created_at": req.get("created_at")
-    })
+    async def events():
+        broker = get_broker()
+        # only the in-process broker misses transitions made on other workers
+        poll = isinstance(broker, InMemoryBroker)
+        async with broker.subscribe(request_id) as queue:
+            current = await findTransactionRequests(request_id=request_id, wallet_id="") or req
+            yield f"event: status\ndata: {orjson.dumps(_statusPayload(request_id, current)).decode()}\n\n"
+            while current.get("status") not in TERMINAL_STATUSES:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=Config.REQUEST_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # The in-memory broker only reaches this worker's subscribers, so a transition made on
+                    # another worker is picked up by re-reading once per heartbeat.
+                    latest = await findTransactionRequests(request_id=request_id, wallet_id="") if poll else None
+                    if latest is None or latest.get("status") == current.get("status"):
+                        yield ": keep-alive\n\n"
+                        continue
+                    message = latest
+                current = {**current, **message}
+                yield f"event: status\ndata: {orjson.dumps(_statusPayload(request_id, current)).decode()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @pay_router.get("/my-requests")
@@ -215,57 +263,48 @@ async def expirePaymentRequest(request_id: str, curr: Annotated[UserInDB, Depend
     if not request_id:
         raise HTTPException(status_code=400, detail="Missing request_id")
 
-    req = await findTransactionRequests(request_id=request_id, wallet_id="")
-    if req is None:
-        raise HTTPException(status_code=404, detail="Payment request not found")
-
-
-    if req.get("status") != "pending":
-        return JSONResponse({
-            "status": "info",
-            "message": f"Payment request is already {req.get('status')}",
-            "current_status": req.get("status")
-        })
-
-    if req.get("recipient_id") != curr.wallet_id:
-        raise HTTPException(status_code=403, detail="You can only expire your own payment requests")
-
     try:
-        success = await updateTransactionRequest(
+        await transitionTransactionRequest(
             request_id=request_id,
-            wallet_id=req["recipient_id"],
-            status="expired"
+            from_status="pending",
+            to_status="expired",
+            wallet_id=curr.wallet_id
         )
+    except TransactionNotFoundError:
+        raise HTTPException(status_code=404, detail="Payment request not found")
+    except TransactionStateConflictError as e:
+        if e.current.get("status") != "pending":
+            return JSONResponse({
+                "status": "info",
+                "message": f"Payment request is already {e.current.get('status')}",
+                "current_status": e.current.get("status")
+            })
+        raise HTTPException(status_code=403, detail="You can only expire your own payment requests")
 
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to expire payment request")
-
-        return JSONResponse({
-            "status": "success",
-            "message": "Payment request expired successfully",
-            "request_id": request_id,
-            "new_status": "expired"
-        })
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to expire payment request: {str(e)}")
+    return JSONResponse({
+        "status": "success",
+        "message": "Payment request expired successfully",
+        "request_id": request_id,
+        "new_status": "expired"
+    })
 
 
 @pay_router.delete("/cancel_request/{request_id}")
 async def cancelPaymentRequest(request_id: str, curr: Annotated[UserInDB, Depends(getUser)]):
-    req = await findTransactionRequests(request_id=request_id, wallet_id=curr.wallet_id)
-    if req is None:
+    try:
+        await transitionTransactionRequest(
+            request_id=request_id,
+            from_status="pending",
+            to_status="cancelled",
+            wallet_id=curr.wallet_id
+        )
+    except TransactionNotFoundError:
         raise HTTPException(status_code=404, detail="Payment request not found or you're not authorized")
-
-    if req.get("status") != "pending":
+    except TransactionStateConflictError as e:
+        if e.current.get("recipient_id") != curr.wallet_id:
+            raise HTTPException(status_code=404, detail="Payment request not found or you're not authorized")
         raise HTTPException(status_code=400, detail="Can only cancel pending requests")
 
-    await updateTransactionRequest(
-        request_id=request_id,
-        wallet_id=curr.wallet_id,
-        status="cancelled"
-    )
-
     return JSONResponse({
         "status": "success",
         "message": "Payment request cancelled"
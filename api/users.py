@@ -3,11 +3,12 @@ from typing import Annotated
 
 from core.models.models import UserInDB
 from core.utlis.getCurrUser import getUser
+from core.utlis.responses import JSONResponse
 
 user_router = APIRouter(prefix="/users" , tags=["users"])
 
 
 
-@user_router.get("/me")
+@user_router.get("/me", response_model=UserInDB)
 async def get_me(curr: Annotated[UserInDB, Depends(getUser)]):
-    return curr
\ No newline at end of file
+    return JSONResponse(curr)
\ No newline at end of file
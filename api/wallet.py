@@ -1,13 +1,24 @@
+import asyncio
+import csv
+import io
+import orjson
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Request
-from starlette.responses import JSONResponse
-from core.database.transaction_db import GetUserByWalletId, addTransaction, transactionHistory, UpdateUserBalanceByWalletId, GetUserDocByWalletId
-from core.models.models import UserInDB
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from core.utlis.responses import JSONResponse
+from core.database.analytics_db import walletDailyRollups
+from core.database.transaction_db import GetUserByWalletId, listTransactions, GetUserDocByWalletId, recentTransactions, applyBalanceChange, transferFunds, sendMoneyBatch, streamTransactions
+from core.models.models import UserInDB, BatchTransferRequest
+from core.utlis.error import TransactionError, ValidationError
 from core.utlis.getCurrUser import getUser
 from core.utlis.limiter import limiter
+from core.utlis.validation import iso_param
 from core.utlis.walletex import WalletEx
 
 wallet_router = APIRouter(prefix="/wallet", tags=["wallet"])
+EXPORT_FIELDS = ("created_at", "id", "type", "amount", "balance_after", "from_wallet_id", "to_wallet_id")
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_CHUNK_ROWS = 200
 ext = WalletEx()
 
 
@@ -25,15 +36,13 @@ async def get_balance(request: Request,curr: Annotated[UserInDB, Depends(getUser
 async def add_funds(request: Request, amount: float, curr: Annotated[UserInDB, Depends(getUser)]):
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be greater than zero")
-    user = await GetUserByWalletId(curr.wallet_id)
+    try:
+        user = await applyBalanceChange(curr.wallet_id, amount, "credit")
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    new_balance = user.balance + amount
-    success = await UpdateUserBalanceByWalletId(user.wallet_id, new_balance)
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to update balance")
-    await addTransaction(user.wallet_id, amount, "credit", new_balance)
-    return JSONResponse({"wallet_id": user.wallet_id, "new_balance": new_balance}, status_code=200)
+    return JSONResponse({"wallet_id": user["wallet_id"], "new_balance": user["balance"]}, status_code=200)
 
 
 @wallet_router.post("/withdraw_funds/{amount}")
@@ -41,17 +50,13 @@ async def add_funds(request: Request, amount: float, curr: Annotated[UserInDB, D
 async def withdraw_funds(request: Request, amount: float, curr: Annotated[UserInDB, Depends(getUser)]):
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be greater than zero")
-    user = await GetUserByWalletId(curr.wallet_id)
+    try:
+        user = await applyBalanceChange(curr.wallet_id, -amount, "debit")
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    if user.balance < amount:
         raise HTTPException(status_code=400, detail="Insufficient funds")
-    new_balance = user.balance - amount
-    success = await UpdateUserBalanceByWalletId(user.wallet_id, new_balance)
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to update balance")
-    await addTransaction(user.wallet_id, -amount, "debit", new_balance)
-    return JSONResponse({"wallet_id": user.wallet_id, "new_balance": new_balance}, status_code=200)
+    return JSONResponse({"wallet_id": user["wallet_id"], "new_balance": user["balance"]}, status_code=200)
 
 
 @wallet_router.post("/send_money/{to_wallet_id}/{amount}")
@@ -59,45 +64,151 @@ async def withdraw_funds(request: Request, amount: float, curr: Annotated[UserIn
 async def send_money(request: Request, to_wallet_id: str, amount: float, curr: Annotated[UserInDB, Depends(getUser)]):
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be greater than zero")
-    from_user = await GetUserByWalletId(curr.wallet_id)
-    to_user = await GetUserByWalletId(to_wallet_id)
-    if not to_user:
+    try:
+        result = await transferFunds(curr.wallet_id, to_wallet_id, amount)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result == "recipient":
         raise HTTPException(status_code=404, detail="Recipient wallet not found")
-    if from_user.balance < amount:
+    if result == "insufficient":
         raise HTTPException(status_code=400, detail="Insufficient funds")
-    new_from_balance = from_user.balance - amount
-    new_to_balance = to_user.balance + amount
-    success_from = await UpdateUserBalanceByWalletId(from_user.wallet_id, new_from_balance)
-    success_to = await UpdateUserBalanceByWalletId(to_user.wallet_id, new_to_balance)
-    if not success_from or not success_to:
-        raise HTTPException(status_code=500, detail="Failed to complete transaction")
-    await addTransaction(from_user.wallet_id, -amount, "debit", new_from_balance)
-    await addTransaction(to_user.wallet_id, amount, "credit", new_to_balance)
+    from_user, to_user = result
     return JSONResponse({
-        "from_wallet_id": from_user.wallet_id,
-        "new_from_balance": new_from_balance,
-        "to_wallet_id": to_user.wallet_id,
-        "new_to_balance": new_to_balance
+        "from_wallet_id": from_user["wallet_id"],
+        "new_from_balance": from_user["balance"],
+        "to_wallet_id": to_user["wallet_id"],
+        "new_to_balance": to_user["balance"]
     }, status_code=200)
 
 
 
+@wallet_router.post("/send_batch")
+@limiter.limit("5/minute")
+async def send_batch(request: Request, batch: BatchTransferRequest, curr: Annotated[UserInDB, Depends(getUser)]):
+    try:
+        outcome = await sendMoneyBatch(curr.wallet_id, [t.model_dump() for t in batch.transfers])
+    except TransactionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if outcome is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    sender, results = outcome
+    succeeded = [r for r in results if r["status"] == "ok"]
+    return JSONResponse({
+        "from_wallet_id": sender["wallet_id"],
+        "new_balance": sender["balance"],
+        "total_sent": sum(r["amount"] for r in succeeded),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "results": results
+    }, status_code=200)
+
+
 @wallet_router.get("/transactions")
 @limiter.limit("10/minute")
-async def transaction_history(request: Request, curr: Annotated[UserInDB, Depends(getUser)]):
-    txs = await transactionHistory(curr.wallet_id)
-    if txs is None or len(txs) == 0:
-        return JSONResponse({"wallet_id": curr.wallet_id, "transactions": []}, status_code=200)
-    return JSONResponse({"wallet_id": curr.wallet_id, "transactions": txs}, status_code=200)
-
+async def transaction_history(request: Request, curr: Annotated[UserInDB, Depends(getUser)],
+                              limit: int = Query(50, ge=1, le=200),
+                              after: str | None = None,
+                              tx_type: str | None = Query(None, alias="type"),
+                              min_amount: float | None = None,
+                              max_amount: float | None = None,
+                              since: str | None = None,
+                              until: str | None = None,
+                              fields: str | None = None):
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        txs, next_cursor = await listTransactions(
+            curr.wallet_id,
+            limit=limit,
+            after=after,
+            tx_type=tx_type,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            since=iso_param(since, "since"),
+            until=iso_param(until, "until"),
+            fields=field_list
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse({"wallet_id": curr.wallet_id, "transactions": txs, "next_cursor": next_cursor}, status_code=200)
+
+
+
+async def _exportRows(wallet_id: str, format: str, since: str | None, until: str | None):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    chunk = []
+    if format == "csv":
+        writer.writeheader()
+        chunk.append(buf.getvalue().encode())
+    async for tx in streamTransactions(wallet_id, since=since, until=until):
+        if format == "csv":
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(tx)
+            chunk.append(buf.getvalue().encode())
+        else:
+            chunk.append(orjson.dumps(tx) + b"\n")
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
+
+
+@wallet_router.get("/transactions/export")
+@limiter.limit("2/minute")
+async def export_transactions(request: Request, curr: Annotated[UserInDB, Depends(getUser)],
+                              format: str = "csv",
+                              since: str | None = None,
+                              until: str | None = None):
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_MEDIA_TYPES)}")
+    try:
+        since, until = iso_param(since, "since"), iso_param(until, "until")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        _exportRows(curr.wallet_id, format, since, until),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions-{curr.wallet_id}.{format}"'}
+    )
+
+
+
+@wallet_router.get("/analytics/daily")
+@limiter.limit("10/minute")
+async def daily_analytics(request: Request, curr: Annotated[UserInDB, Depends(getUser)],
+                          since: str | None = None,
+                          until: str | None = None,
+                          limit: int = Query(31, ge=1, le=366)):
+    try:
+        since, until = iso_param(since, "since"), iso_param(until, "until")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    days = await walletDailyRollups(curr.wallet_id, since=since, until=until, limit=limit)
+    return JSONResponse({
+        "wallet_id": curr.wallet_id,
+        "days": [{
+            "day": day["day"],
+            "inflow": day["inflow"],
+            "outflow": day["outflow"],
+            "net": day["inflow"] - day["outflow"],
+            "count": day["count"],
+            "credits": day["credits"],
+            "debits": day["debits"],
+            "end_balance": day["closing"]["balance"]
+        } for day in days]
+    }, status_code=200)
 
 
 @wallet_router.get("/profile")
 async def get_profile(request: Request, curr: Annotated[UserInDB, Depends(getUser)]):
-    doc = await GetUserDocByWalletId(curr.wallet_id)
+    doc, txs = await asyncio.gather(
+        GetUserDocByWalletId(curr.wallet_id),
+        recentTransactions(curr.wallet_id, 10)
+    )
     if doc is None:
         raise HTTPException(status_code=404, detail="User not found")
-    txs = doc["transactions"] if "transactions" in doc else []
     profile_data = {
         "username": doc["username"],
         "email": doc["email"],
@@ -105,8 +216,8 @@ async def get_profile(request: Request, curr: Annotated[UserInDB, Depends(getUse
         "phoneNumber": doc["phoneNumber"],
         "wallet_id": doc["wallet_id"],
         "balance": doc["balance"] or 0.0,
-        "transactions_count": len(txs),
-        "recent_transactions": txs[:10]
+        "transactions_count": doc.get("transactions_count", 0),
+        "recent_transactions": txs
     }
     return JSONResponse({"profile": profile_data}, status_code=200)
 
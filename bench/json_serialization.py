@@ -0,0 +1,65 @@
+"""Compare the stdlib JSON response path with core.utlis.responses.JSONResponse.
+
+Run from the repository root:  python -m bench.json_serialization [--entries 1000] [--rounds 200]
+"""
+import argparse
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse as StdJSONResponse
+from core.models.models import UserInDB
+from core.utlis.responses import JSONResponse
+
+
+def _transactions(count: int) -> list[dict]:
+    start = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "amount": float(i % 500) - 250.0,
+            "type": "credit" if i % 2 else "debit",
+            "balance_after": 1000.0 + i,
+            "created_at": (start - timedelta(seconds=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def _user() -> UserInDB:
+    return UserInDB(**{
+        "_id": "64f000000000000000000000",
+        "wallet_id": "abcdefghijklmn",
+        "username": "merchant01",
+        "email": "merchant@example.com",
+        "full_name": "merchant one",
+        "hashed_password": "$2b$12$" + "x" * 53,
+        "phoneNumber": "1234567890",
+        "balance": 1500.0,
+    })
+
+
+def _time(fn, rounds: int) -> float:
+    return min(timeit.repeat(fn, number=rounds, repeat=5)) / rounds
+
+
+def main(entries: int, rounds: int):
+    body = {"wallet_id": "abcdefghijklmn", "transactions": _transactions(entries), "next_cursor": None}
+    user = _user()
+    cases = [
+        (f"dict, {entries} transactions: stdlib json", lambda: StdJSONResponse(body)),
+        (f"dict, {entries} transactions: orjson", lambda: JSONResponse(body)),
+        ("UserInDB: jsonable_encoder + stdlib json", lambda: StdJSONResponse(jsonable_encoder(user))),
+        ("UserInDB: direct to bytes", lambda: JSONResponse(user)),
+    ]
+    print(f"{'case':<50} {'per call':>12}")
+    for label, fn in cases:
+        print(f"{label:<50} {_time(fn, rounds) * 1e6:>10.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    main(args.entries, args.rounds)
@@ -0,0 +1,325 @@
+"""End-to-end load test of the money-moving paths against the real FastAPI app.
+
+Run from the repository root:
+    python -m bench.load [--mongo memory|mongodb://localhost:27017] [--users 20] [--concurrency 10] [--iterations 20]
+    python -m bench.load --save-baseline      # record bench/baseline.json
+    python -m bench.load --check              # rerun with the baseline's parameters, exit 1 on regression
+    python -m bench.load --runs 5             # report the per-endpoint median of five runs
+
+Requests go through httpx's ASGI transport, so the app, the client and the
+event loop share one process; rate limits are switched off for the run.
+`memory` uses mongomock-motor as an in-process stand-in, any other value is a
+MongoDB URI and the run uses (then drops) a throwaway database on it.
+
+DB ops per request come from the Server-Timing header. Against mongod that is
+the pymongo command count; the stand-in emits no command events, so there
+each collection call is counted as one command. The stand-in also gets fixes
+for its find_one_and_update post-image and $max, see _instrumentStandIn. DB ops are deterministic for a
+given code path, which makes them the part of the baseline to watch in review.
+Latencies depend on the machine and on how the concurrent workers happen to
+interleave: each figure is the median over --runs runs, and only p50 fails the
+check (beyond --tolerance), since a tail percentile over a few hundred samples
+moves by several milliseconds between identical runs.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from functools import wraps
+import httpx
+from config import Config
+import core.database.db as database
+from core.database.indexes import create_indexes
+from core.database.monitoring import db_request_stats
+from core.utlis.limiter import limiter
+import main as app_module
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+PASSWORD = "Bench#Pass1"
+SEED_FUNDS = 100000
+STAND_IN_COMMANDS = [
+    "find_one", "find_one_and_update", "update_one", "update_many", "insert_one",
+    "insert_many", "delete_one", "count_documents", "bulk_write", "find", "aggregate",
+]
+SERVER_TIMING_COMMANDS = re.compile(r'db;[^,]*desc="(\d+) commands"')
+_stand_in_instrumented = False
+
+
+def _instrumentStandIn():
+    global _stand_in_instrumented
+    if _stand_in_instrumented:
+        return
+    _stand_in_instrumented = True
+    from mongomock import collection as mongomock_collection
+    from mongomock_motor import AsyncMongoMockCollection
+
+    def counted(method):
+        if asyncio.iscoroutinefunction(method):
+            @wraps(method)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    stats = db_request_stats.get()
+                    if stats is not None:
+                        stats.record(time.perf_counter() - start)
+        else:
+            @wraps(method)
+            def wrapper(*args, **kwargs):
+                stats = db_request_stats.get()
+                if stats is not None:
+                    stats.record(0.0)
+                return method(*args, **kwargs)
+        return wrapper
+
+    find_one_and_update = AsyncMongoMockCollection.find_one_and_update
+
+    # mongomock re-reads the post-image with the original filter unless _id is
+    # projected, which loses every compare-and-set update; project it and drop it here.
+    @wraps(find_one_and_update)
+    async def findOneAndUpdate(self, *args, projection=None, **kwargs):
+        if projection and projection.get("_id") == 0:
+            trimmed = {key: value for key, value in projection.items() if key != "_id"} or None
+            doc = await find_one_and_update(self, *args, projection=trimmed, **kwargs)
+            if doc is not None:
+                doc.pop("_id", None)
+            return doc
+        return await find_one_and_update(self, *args, projection=projection, **kwargs)
+
+    AsyncMongoMockCollection.find_one_and_update = findOneAndUpdate
+
+    # mongomock's $max cannot compare embedded documents (the rollups' "closing"); compare field by field like MongoDB.
+    max_updater = mongomock_collection._updaters["$max"]
+
+    def maxUpdater(doc, field_name, value):
+        if not isinstance(value, dict):
+            return max_updater(doc, field_name, value)
+        current = doc.get(field_name)
+        if current is None or tuple(value.values()) > tuple(current.values()):
+            doc[field_name] = value
+
+    mongomock_collection._updaters["$max"] = maxUpdater
+    for name in STAND_IN_COMMANDS:
+        setattr(AsyncMongoMockCollection, name, counted(getattr(AsyncMongoMockCollection, name)))
+
+
+async def _connect(mongo: str):
+    Config.secret_key = Config.secret_key or os.urandom(32).hex()
+    if mongo == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--mongo memory needs mongomock-motor (pip install mongomock-motor)")
+        _instrumentStandIn()
+        database.db = AsyncMongoMockClient()["raxwallet_bench"]
+        return None
+    Config.mongo_uri = mongo
+    Config.mongo_db = f"raxwallet_bench_{os.getpid()}"
+    await database.initDB()
+    await create_indexes()
+    return database.get_client()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        match = SERVER_TIMING_COMMANDS.search(response.headers.get("server-timing", ""))
+        self.samples[name].append((elapsed, response.status_code, int(match.group(1)) if match else None))
+        return response
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def _summary(recorder: Recorder, wall_seconds: float) -> dict:
+    endpoints = {}
+    total = 0
+    for name, samples in recorder.samples.items():
+        latencies = [elapsed for elapsed, _, _ in samples]
+        ops = [count for _, _, count in samples if count is not None]
+        total += len(samples)
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": sum(1 for _, status, _ in samples if status >= 400),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "db_ops": round(sum(ops) / len(ops), 2) if ops else None,
+        }
+    return {"throughput_rps": round(total / wall_seconds, 1), "endpoints": endpoints}
+
+
+async def _setupUser(client: httpx.AsyncClient, recorder: Recorder, index: int) -> dict:
+    username = f"bench{index:05d}"
+    register = await recorder.call(client, "register", "POST", "/auth/register", json={
+        "phoneNumber": f"9{index:09d}",
+        "username": username,
+        "password": PASSWORD,
+        "email": f"{username}@bench.io",
+        "full_name": f"bench user {index}",
+    })
+    register.raise_for_status()
+    login = await recorder.call(client, "login", "POST", "/auth/login", json={"username": username, "password": PASSWORD})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    me = await client.get("/users/me", headers=headers)
+    funded = await client.post(f"/wallet/add_funds/{SEED_FUNDS}", headers=headers)
+    funded.raise_for_status()
+    return {"headers": headers, "wallet_id": me.json()["wallet_id"]}
+
+
+async def _paymentRound(client: httpx.AsyncClient, recorder: Recorder, payer: dict, merchant: dict, qr_format: str):
+    created = await recorder.call(client, "create_qr_request", "POST", "/payments/create_qr_request",
+                                  json={"amount": 1, "description": "bench"}, headers=merchant["headers"])
+    request_id = created.json()["request_id"]
+    await recorder.call(client, "qr_code", "GET", f"/payments/qr_code/{request_id}?format={qr_format}")
+    await recorder.call(client, "request_status", "GET", f"/payments/request_status/{request_id}")
+    await recorder.call(client, "process_action", "POST", "/payments/process_action",
+                        json={"request_id": request_id, "action": "accept"}, headers=payer["headers"])
+    await recorder.call(client, "request_status", "GET", f"/payments/request_status/{request_id}")
+    await recorder.call(client, "send_money", "POST", f"/wallet/send_money/{merchant['wallet_id']}/1", headers=payer["headers"])
+
+
+async def run(mongo: str, users: int, concurrency: int, iterations: int, qr_format: str) -> dict:
+    client_to_close = await _connect(mongo)
+    limiter.enabled = False
+    logging.getLogger("raxwallet.requests").setLevel(logging.ERROR)
+    setup_recorder, recorder = Recorder(), Recorder()
+    transport = httpx.ASGITransport(app=app_module.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            setup_start = time.perf_counter()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def setupOne(index):
+                async with semaphore:
+                    return await _setupUser(client, setup_recorder, index)
+
+            accounts = await asyncio.gather(*(setupOne(index) for index in range(users)))
+            setup_seconds = time.perf_counter() - setup_start
+
+            async def worker(worker_id):
+                for iteration in range(iterations):
+                    payer = accounts[(worker_id + iteration) % users]
+                    merchant = accounts[(worker_id + iteration + 1) % users]
+                    await _paymentRound(client, recorder, payer, merchant, qr_format)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+            wall_seconds = time.perf_counter() - start
+    finally:
+        if client_to_close is not None:
+            await client_to_close.drop_database(Config.mongo_db)
+            client_to_close.close()
+
+    result = _summary(recorder, wall_seconds)
+    result["endpoints"] = {**_summary(setup_recorder, setup_seconds)["endpoints"], **result["endpoints"]}
+    result["setup_seconds"] = round(setup_seconds, 2)
+    result["params"] = {"mongo": "memory" if mongo == "memory" else "mongod", "users": users,
+                        "concurrency": concurrency, "iterations": iterations, "qr_format": qr_format}
+    return result
+
+
+def _combine(results: list[dict]) -> dict:
+    """Median of each latency figure across runs; errors and db ops keep the worst run."""
+    combined = {**results[-1], "throughput_rps": statistics.median(r["throughput_rps"] for r in results),
+                "setup_seconds": statistics.median(r["setup_seconds"] for r in results), "endpoints": {}}
+    for name, stats in results[-1]["endpoints"].items():
+        runs = [r["endpoints"][name] for r in results if name in r["endpoints"]]
+        ops = [run["db_ops"] for run in runs if run["db_ops"] is not None]
+        combined["endpoints"][name] = {
+            "requests": stats["requests"],
+            "errors": max(run["errors"] for run in runs),
+            **{key: round(statistics.median(run[key] for run in runs), 2) for key in ("p50_ms", "p95_ms", "p99_ms")},
+            "db_ops": max(ops) if ops else None,
+        }
+    combined["params"] = {**combined["params"], "runs": len(results)}
+    return combined
+
+
+def _print(result: dict):
+    print(f"{result['params']}  throughput {result['throughput_rps']} req/s (payment rounds)  setup {result['setup_seconds']}s")
+    print(f"{'endpoint':<20} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'db ops':>7}")
+    for name, stats in result["endpoints"].items():
+        db_ops = "-" if stats["db_ops"] is None else f"{stats['db_ops']:g}"
+        print(f"{name:<20} {stats['requests']:>8} {stats['errors']:>6} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {db_ops:>7}")
+
+
+def _regressions(result: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    problems = []
+    for name, base in baseline["endpoints"].items():
+        current = result["endpoints"].get(name)
+        if current is None:
+            problems.append(f"{name}: missing from this run")
+            continue
+        if current["errors"] > base["errors"]:
+            problems.append(f"{name}: errors {base['errors']} -> {current['errors']}")
+        # db ops are averaged and user cache hits vary with interleaving, so allow half a command of noise.
+        if base["db_ops"] is not None and current["db_ops"] is not None and current["db_ops"] > base["db_ops"] + 0.5:
+            problems.append(f"{name}: db ops per request {base['db_ops']:g} -> {current['db_ops']:g}")
+        if current["p50_ms"] > base["p50_ms"] * (1 + tolerance) and current["p50_ms"] - base["p50_ms"] > min_delta_ms:
+            problems.append(f"{name}: p50 {base['p50_ms']}ms -> {current['p50_ms']}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo", default="memory", help="'memory' for the in-process stand-in, or a MongoDB URI")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=20, help="payment rounds per concurrent worker")
+    parser.add_argument("--qr-format", default="png", choices=["png", "svg"])
+    parser.add_argument("--runs", type=int, default=3, help="repeat the load and report the median of each latency")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="compare against the baseline and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative p50 increase for --check")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore p50 increases smaller than this")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        defaults = {action.dest: action.default for action in parser._actions}
+        for key, value in baseline["params"].items():
+            if key != "mongo" and getattr(args, key) == defaults[key]:
+                setattr(args, key, value)
+
+    result = _combine([asyncio.run(run(args.mongo, args.users, args.concurrency, args.iterations, args.qr_format))
+                       for _ in range(max(1, args.runs))])
+    _print(result)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    if baseline is not None:
+        if baseline["params"]["mongo"] != result["params"]["mongo"]:
+            print(f"note: baseline was recorded against {baseline['params']['mongo']}, this run used {result['params']['mongo']}")
+        problems = _regressions(result, baseline, args.tolerance, args.min_delta_ms)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
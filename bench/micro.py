@@ -0,0 +1,152 @@
+"""Micro-benchmarks for the CPU hot spots: tokens, password hashing, QR rendering, user model and validators.
+
+Run from the repository root:
+    python -m bench.micro [--filter qr] [--sizes 0,1000,50000] [--save before.json] [--compare before.json]
+
+Each case is timed with timeit (autoranged, best of --repeat), so figures from
+two commits on the same machine can be compared with --save/--compare.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+from jose import jwt
+from config import Config
+from core.models.models import UserInDB
+from core.utlis.jwt_gen import create_access_token
+from core.utlis.qr import _render
+from core.utlis.security import password_context
+from core.utlis.user_cache import user_cache
+from core.utlis.validation import validate_amount, validatePass
+from core.utlis.getCurrUser import getUser
+
+
+def _complete(coro):
+    """Run a coroutine that never suspends (validatePass, a cache-hit getUser) without an event loop."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("coroutine suspended; it needs an event loop")
+
+
+def _userDoc(transactions: int) -> dict:
+    start = datetime.now(timezone.utc)
+    return {
+        "_id": "64f000000000000000000000",
+        "wallet_id": "abcdefghijklmn",
+        "username": "merchant01",
+        "email": "merchant@example.com",
+        "full_name": "merchant one",
+        "hashed_password": "$2b$12$" + "x" * 53,
+        "phoneNumber": "1234567890",
+        "balance": 1500.0,
+        "transactions": [
+            {
+                "id": str(uuid.uuid4()),
+                "amount": float(i % 500),
+                "type": "credit" if i % 2 else "debit",
+                "balance_after": 1000.0 + i,
+                "created_at": (start - timedelta(seconds=i)).isoformat(),
+            }
+            for i in range(transactions)
+        ],
+    }
+
+
+def _cases(sizes: list[int]) -> list[tuple[str, callable]]:
+    claims = {"sub": "merchant01", "user_id": "64f000000000000000000000"}
+    token = create_access_token(claims)
+    hashed = password_context.hash("Bench#Pass1")
+    user_cache.set(UserInDB(**_userDoc(0)))
+    payload = "http://localhost:8000/payments/scan?request_id=" + str(uuid.uuid4())
+
+    cases = [
+        ("create_access_token", lambda: create_access_token(claims)),
+        ("jwt.decode", lambda: jwt.decode(token, Config.secret_key, algorithms=[Config.ALGORITHM],
+                                          audience=Config.AUDIENCE, issuer=Config.ISSUER)),
+        ("getUser (cache hit)", lambda: _complete(getUser(token))),
+        ("bcrypt hash", lambda: password_context.hash("Bench#Pass1")),
+        ("bcrypt verify", lambda: password_context.verify("Bench#Pass1", hashed)),
+        ("qrcode svg", lambda: _render(payload, "svg")),
+        ("qrcode png", lambda: _render(payload, "png")),
+    ]
+    for size in sizes:
+        doc = _userDoc(size)
+        cases.append((f"UserInDB(**doc) transactions={size}", lambda doc=doc: UserInDB(**doc)))
+    cases += [
+        ("validate_amount valid", lambda: validate_amount("2500")),
+        ("validate_amount invalid", lambda: validate_amount("abc")),
+        ("validatePass valid", lambda: _complete(validatePass("Str0ng#Password"))),
+        ("validatePass short", lambda: _complete(validatePass("short"))),
+    ]
+    return cases
+
+
+def _time(fn, repeat: int) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.2f}us"
+
+
+def main(name_filter: str, sizes: list[int], repeat: int, save: str | None, compare: str | None):
+    Config.secret_key = Config.secret_key or os.urandom(32).hex()
+    previous = {}
+    if compare:
+        with open(compare) as f:
+            previous = json.load(f)["results"]
+
+    results = {}
+    print(f"{'case':<40} {'per call':>12} {'previous':>12} {'change':>8}")
+    for label, fn in _cases(sizes):
+        if name_filter and name_filter not in label:
+            continue
+        try:
+            seconds = _time(fn, repeat)
+        except ImportError as e:
+            print(f"{label:<40} {'skipped':>12}  ({e.name or e} not installed)")
+            continue
+        results[label] = seconds
+        before = previous.get(label)
+        change = f"{(seconds / before - 1) * 100:+.0f}%" if before else ""
+        print(f"{label:<40} {_format(seconds):>12} {_format(before) if before else '':>12} {change:>8}")
+
+    if save:
+        with open(save, "w") as f:
+            json.dump({
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"results written to {save}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--sizes", default="0,1000,50000", help="embedded transaction counts for UserInDB")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON from an earlier --save to compare against")
+    args = parser.parse_args()
+    main(args.filter, [int(size) for size in args.sizes.split(",") if size], args.repeat, args.save, args.compare)
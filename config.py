@@ -6,9 +6,48 @@ load_dotenv()
 class Config:
     mongo_uri = os.getenv("MONGO_URL") or ""
     mongo_db = os.getenv("MONGO_DBNAME") or ""
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE") or "100")
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE") or "0")
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS")) if os.getenv("MONGO_MAX_IDLE_TIME_MS") else None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS")) if os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS") else None
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS") or "30000")
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS") or "20000")
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS")) if os.getenv("MONGO_SOCKET_TIMEOUT_MS") else None
+    MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS") or ""
+    MONGO_RETRY_WRITES = (os.getenv("MONGO_RETRY_WRITES") or "true").lower() == "true"
+    MONGO_RETRY_READS = (os.getenv("MONGO_RETRY_READS") or "true").lower() == "true"
     secret_key = os.getenv("API_SECRET_KEY") or ""
     ALGORITHM = os.getenv("ALGORITHM") or "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES") or "15")
+    REQUEST_SWEEP_INTERVAL_SECONDS = float(os.getenv("REQUEST_SWEEP_INTERVAL_SECONDS") or "15")
+    REQUEST_SWEEP_BATCH_SIZE = int(os.getenv("REQUEST_SWEEP_BATCH_SIZE") or "500")
+    REQUEST_PROCESSING_TIMEOUT_SECONDS = float(os.getenv("REQUEST_PROCESSING_TIMEOUT_SECONDS") or "60")
+    REQUEST_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("REQUEST_EVENTS_HEARTBEAT_SECONDS") or "15")
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE") or "10000")
+    USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS") or "30")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS") or "4")
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE") or "64")
+    QR_CACHE_MAX_BYTES = int(os.getenv("QR_CACHE_MAX_BYTES") or str(8 * 1024 * 1024))
+    RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI") or "memory://"
+    RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY") or "sliding-window-counter"
+    RATE_LIMIT_KEY_PREFIX = os.getenv("RATE_LIMIT_KEY_PREFIX") or "raxwallet"
+    HOST = os.getenv("HOST") or "localhost"
+    PORT = int(os.getenv("PORT") or "8000")
+    UDS = os.getenv("UDS") or None
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or str(os.cpu_count() or 1))
+    UVICORN_LOOP = os.getenv("UVICORN_LOOP") or "auto"
+    UVICORN_HTTP = os.getenv("UVICORN_HTTP") or "auto"
+    KEEP_ALIVE_SECONDS = int(os.getenv("KEEP_ALIVE_SECONDS") or "5")
+    BACKLOG = int(os.getenv("BACKLOG") or "2048")
+    GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS") or "30")
+    STARTUP_LOCK_SECONDS = float(os.getenv("STARTUP_LOCK_SECONDS") or "300")
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN") or ""
+    METRICS_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("METRICS_LOOP_LAG_INTERVAL_SECONDS") or "0.5")
+    SERVER_TIMING = (os.getenv("SERVER_TIMING") or "true").lower() == "true"
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS") or "500")
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or ""
+    PROFILE_DIR = os.getenv("PROFILE_DIR") or "profiles"
+    OPS_TOKEN = os.getenv("OPS_TOKEN") or ""
     ISSUER = "wallet-api"
     AUDIENCE = "wallet-clients"
     @staticmethod
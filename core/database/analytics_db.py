@@ -0,0 +1,173 @@
+import logging
+from pymongo import UpdateOne
+from core.database.db import get_db
+from core.database.monitoring import dbCaller
+
+logger = logging.getLogger("raxwallet.rollups")
+
+PLATFORM_KINDS = ("deposits", "withdrawals", "transfers")
+ROLLUP_PROJECTION = {"_id": 0}
+
+
+def _day(created_at: str) -> str:
+    return created_at[:10]
+
+
+def _hour(created_at: str) -> str:
+    return created_at[:13]
+
+
+def _platformKind(entry: dict) -> str | None:
+    # a transfer writes two ledger entries; platform volume counts it once, on the sending side
+    if "from_wallet_id" in entry:
+        return None
+    if "to_wallet_id" in entry:
+        return "transfers"
+    return "deposits" if entry["amount"] > 0 else "withdrawals"
+
+
+def _rollupWrites(entries: list[dict]) -> tuple[list[UpdateOne], list[UpdateOne]]:
+    wallets = {}
+    hours = {}
+    for entry in entries:
+        amount = entry["amount"]
+        key = (entry["wallet_id"], _day(entry["created_at"]))
+        wallet = wallets.setdefault(key, {"inc": {"inflow": 0.0, "outflow": 0.0, "credits": 0, "debits": 0, "count": 0}, "closing": None})
+        inc = wallet["inc"]
+        inc["count"] += 1
+        if amount >= 0:
+            inc["inflow"] += amount
+            inc["credits"] += 1
+        else:
+            inc["outflow"] -= amount
+            inc["debits"] += 1
+        closing = {"at": entry["created_at"], "balance": entry["balance_after"]}
+        if wallet["closing"] is None or closing["at"] >= wallet["closing"]["at"]:
+            wallet["closing"] = closing
+
+        kind = _platformKind(entry)
+        if kind is None:
+            continue
+        hour = hours.setdefault(_hour(entry["created_at"]), {"transactions": 0, "volume": 0.0})
+        hour["transactions"] += 1
+        hour["volume"] += abs(amount)
+        hour[f"{kind}.count"] = hour.get(f"{kind}.count", 0) + 1
+        hour[f"{kind}.amount"] = hour.get(f"{kind}.amount", 0.0) + abs(amount)
+
+    # $max on {at, balance} compares "at" first, so the latest entry's balance wins however writes interleave
+    wallet_ops = [
+        UpdateOne(
+            {"wallet_id": wallet_id, "day": day},
+            {"$inc": wallet["inc"], "$max": {"closing": wallet["closing"]}},
+            upsert=True
+        )
+        for (wallet_id, day), wallet in wallets.items()
+    ]
+    platform_ops = [UpdateOne({"hour": hour}, {"$inc": inc}, upsert=True) for hour, inc in hours.items()]
+    return wallet_ops, platform_ops
+
+
+@dbCaller
+async def recordRollups(entries: list[dict]):
+    """Fold new ledger entries into the wallet_daily and platform_hourly rollups.
+
+    Rollups are derived data: a failed write is logged rather than failing the
+    payment, and `python -m core.database.migrations rollups` rebuilds them.
+    """
+    db = get_db()
+    wallet_ops, platform_ops = _rollupWrites(entries)
+    try:
+        await db.wallet_daily.bulk_write(wallet_ops, ordered=False)
+        if platform_ops:
+            await db.platform_hourly.bulk_write(platform_ops, ordered=False)
+    except Exception:
+        logger.exception("Error updating rollups for %d ledger entries", len(entries))
+
+
+@dbCaller
+async def walletDailyRollups(wallet_id: str, since: str = None, until: str = None, limit: int = 31) -> list:
+    db = get_db()
+    query = {"wallet_id": wallet_id}
+    day_range = {}
+    if since:
+        day_range["$gte"] = _day(since)
+    if until:
+        day_range["$lte"] = _day(until)
+    if day_range:
+        query["day"] = day_range
+    cursor = db.wallet_daily.find(query, ROLLUP_PROJECTION).sort("day", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+@dbCaller
+async def platformHourlyRollups(since: str = None, until: str = None, limit: int = 168) -> list:
+    db = get_db()
+    query = {}
+    hour_range = {}
+    if since:
+        hour_range["$gte"] = _hour(since)
+    if until:
+        hour_range["$lte"] = _hour(until)
+    if hour_range:
+        query["hour"] = hour_range
+    cursor = db.platform_hourly.find(query, ROLLUP_PROJECTION).sort("hour", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+def walletDailyPipeline() -> list[dict]:
+    """Rebuild wallet_daily from the whole ledger; same fields as _rollupWrites produces."""
+    return [
+        {"$sort": {"wallet_id": 1, "created_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": {"wallet_id": "$wallet_id", "day": {"$substrBytes": ["$created_at", 0, 10]}},
+            "inflow": {"$sum": {"$cond": [{"$gte": ["$amount", 0]}, "$amount", 0]}},
+            "outflow": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, {"$abs": "$amount"}, 0]}},
+            "credits": {"$sum": {"$cond": [{"$gte": ["$amount", 0]}, 1, 0]}},
+            "debits": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, 1, 0]}},
+            "count": {"$sum": 1},
+            "closing": {"$last": {"at": "$created_at", "balance": "$balance_after"}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "wallet_id": "$_id.wallet_id",
+            "day": "$_id.day",
+            "inflow": 1, "outflow": 1, "credits": 1, "debits": 1, "count": 1, "closing": 1,
+        }},
+        {"$out": "wallet_daily"},
+    ]
+
+
+def platformHourlyPipeline() -> list[dict]:
+    """Rebuild platform_hourly from the whole ledger, classifying entries like _platformKind."""
+    kind_sums = {}
+    for kind in PLATFORM_KINDS:
+        is_kind = {"$eq": ["$kind", kind]}
+        kind_sums[f"{kind}_count"] = {"$sum": {"$cond": [is_kind, 1, 0]}}
+        kind_sums[f"{kind}_amount"] = {"$sum": {"$cond": [is_kind, "$abs_amount", 0]}}
+    return [
+        {"$match": {"from_wallet_id": {"$exists": False}}},
+        {"$set": {
+            "abs_amount": {"$abs": "$amount"},
+            "kind": {"$switch": {
+                "branches": [
+                    {"case": {"$ifNull": ["$to_wallet_id", False]}, "then": "transfers"},
+                    {"case": {"$gt": ["$amount", 0]}, "then": "deposits"},
+                ],
+                "default": "withdrawals",
+            }},
+        }},
+        {"$group": {
+            "_id": {"$substrBytes": ["$created_at", 0, 13]},
+            "transactions": {"$sum": 1},
+            "volume": {"$sum": "$abs_amount"},
+            **kind_sums,
+        }},
+        {"$project": {
+            "_id": 0,
+            "hour": "$_id",
+            "transactions": 1,
+            "volume": 1,
+            **{kind: {"count": f"${kind}_count", "amount": f"${kind}_amount"} for kind in PLATFORM_KINDS},
+        }},
+        {"$out": "platform_hourly"},
+    ]
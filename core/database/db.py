@@ -1,15 +1,40 @@
+import os
+import socket
+from datetime import datetime, timedelta, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from config import Config
+from core.database.monitoring import CommandTimingListener, PoolStatsListener
 
 client = None
 db = None
+pool_stats = PoolStatsListener()
+command_timings = CommandTimingListener()
+
+
+def _clientOptions() -> dict:
+    options = {
+        "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": Config.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": Config.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": Config.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": Config.MONGO_SOCKET_TIMEOUT_MS,
+        "retryWrites": Config.MONGO_RETRY_WRITES,
+        "retryReads": Config.MONGO_RETRY_READS,
+        "event_listeners": [pool_stats, command_timings],
+    }
+    if Config.MONGO_COMPRESSORS:
+        options["compressors"] = Config.MONGO_COMPRESSORS
+    return {key: value for key, value in options.items() if value is not None}
 
 
 async def initDB():
     global client, db
     try:
         Config.validate()
-        client = AsyncIOMotorClient(Config.mongo_uri, )
+        client = AsyncIOMotorClient(Config.mongo_uri, **_clientOptions())
         db = client[Config.mongo_db]
         return db
     except:
@@ -26,3 +51,30 @@ def get_db():
 def get_client():
     return client
 
+
+def get_pool_stats() -> dict:
+    return pool_stats.snapshot()
+
+
+def _lockOwner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquireLock(name: str, ttl_seconds: float) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        await get_db().locks.update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {
+                "expires_at": now + timedelta(seconds=ttl_seconds),
+                "owner": _lockOwner()
+            }},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def releaseLock(name: str):
+    await get_db().locks.delete_one({"_id": name, "owner": _lockOwner()})
@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from core.database.db import initDB, get_db, get_client
+
+logger = logging.getLogger("raxwallet.indexes")
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("phoneNumber", ASCENDING)], unique=True),
+        IndexModel([("wallet_id", ASCENDING)], unique=True),
+    ],
+    "ledger": [
+        IndexModel([("wallet_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("wallet_id", ASCENDING), ("id", ASCENDING)], unique=True),
+    ],
+    "payment_requests": [
+        IndexModel([("request_id", ASCENDING)], unique=True),
+        IndexModel([("recipient_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("recipient_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], partialFilterExpression={"status": "pending"}),
+        IndexModel([("updated_at", ASCENDING)], partialFilterExpression={"status": "processing"}),
+    ],
+    "wallet_daily": [
+        IndexModel([("wallet_id", ASCENDING), ("day", DESCENDING)], unique=True),
+    ],
+    "platform_hourly": [
+        IndexModel([("hour", DESCENDING)], unique=True),
+    ],
+}
+
+# Indexes earlier releases created that an entry above replaces; they are dropped when found.
+SUPERSEDED = {
+    "ledger": [
+        [("wallet_id", ASCENDING), ("created_at", DESCENDING)],
+    ],
+}
+
+# Options that change what an index enforces or covers; a difference means the index is rebuilt.
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _keyOf(spec) -> tuple:
+    return tuple((field, int(direction)) for field, direction in dict(spec).items())
+
+
+def _optionsOf(spec: dict) -> dict:
+    return {option: spec[option] for option in INDEX_OPTIONS if spec.get(option) not in (None, False)}
+
+
+async def _ensureCollection(name: str, models: list[IndexModel]) -> dict:
+    collection = get_db()[name]
+    existing = {}
+    async for index in collection.list_indexes():
+        existing[_keyOf(index["key"])] = index
+
+    missing = []
+    rebuilt = []
+    for model in models:
+        current = existing.get(_keyOf(model.document["key"]))
+        if current is None:
+            missing.append(model)
+        elif _optionsOf(current) != _optionsOf(model.document):
+            # MongoDB refuses a second index on the same key with other options, so the old one goes first.
+            await collection.drop_index(current["name"])
+            rebuilt.append(current["name"])
+            missing.append(model)
+    created = await collection.create_indexes(missing) if missing else []
+
+    superseded = {_keyOf(key) for key in SUPERSEDED.get(name, [])}
+    dropped = []
+    for key in superseded & existing.keys():
+        await collection.drop_index(existing[key]["name"])
+        dropped.append(existing[key]["name"])
+
+    wanted = {_keyOf(model.document["key"]) for model in models}
+    unmanaged = [index["name"] for key, index in existing.items() if key not in wanted | superseded and index["name"] != "_id_"]
+    return {"created": created, "rebuilt": rebuilt, "dropped": dropped, "unmanaged": unmanaged}
+
+
+async def create_indexes() -> dict:
+    try:
+        names = list(INDEXES)
+        results = await asyncio.gather(*(_ensureCollection(name, INDEXES[name]) for name in names))
+        summary = dict(zip(names, results))
+        for action in ("created", "rebuilt", "dropped"):
+            names = [f"{name}.{index}" for name, result in summary.items() for index in result[action]]
+            if names:
+                # dropping an index is worth seeing without INFO logging enabled
+                level = logging.INFO if action == "created" else logging.WARNING
+                logger.log(level, "Database indexes %s: %s", action, ", ".join(names))
+        return summary
+    except Exception:
+        logger.exception("Error creating indexes")
+        return {}
+
+
+def _queryPlans() -> list[tuple]:
+    now = datetime.now(timezone.utc).isoformat()
+    oid = ObjectId()
+    return [
+        ("transaction_db.GetUserByUsername", "users", {"username": "x"}, None),
+        ("transaction_db.GetUserByWalletId", "users", {"wallet_id": "x"}, None),
+        ("transaction_db.adjustBalance", "users", {"wallet_id": "x", "balance": {"$gte": 1}}, None),
+        ("transaction_db.sendMoneyBatch", "users", {"wallet_id": {"$in": ["x", "y"]}}, None),
+        ("transaction_db.listTransactions", "ledger", {"wallet_id": "x"}, {"created_at": -1, "_id": -1}),
+        ("transaction_db.listTransactions(after)", "ledger",
+         {"wallet_id": "x", "$or": [{"created_at": {"$lt": now}}, {"created_at": now, "_id": {"$lt": oid}}]},
+         {"created_at": -1, "_id": -1}),
+        ("transaction_db.recentTransactions", "ledger", {"wallet_id": "x"}, {"created_at": -1}),
+        ("transaction_db.countTransactions", "ledger", {"wallet_id": "x"}, None),
+        ("reqs_db.findTransactionRequests", "payment_requests", {"request_id": "x"}, None),
+        ("reqs_db.findTransactionRequests(wallet)", "payment_requests", {"request_id": "x", "recipient_id": "y"}, None),
+        ("reqs_db.transitionTransactionRequest", "payment_requests",
+         {"request_id": "x", "$or": [{"status": "processing"}, {"status": "pending", "$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}]}]},
+         None),
+        ("reqs_db.filterTransactionRequests", "payment_requests", {"recipient_id": "x", "status": "pending"}, {"created_at": -1}),
+        ("reqs_db.getRequests", "payment_requests", {"recipient_id": "x"}, {"created_at": -1}),
+        ("reqs_db.expireDueRequests", "payment_requests", {"status": "pending", "expires_at": {"$ne": None, "$lte": now}}, None),
+        ("reqs_db.recoverStaleProcessing", "payment_requests", {"status": "processing", "updated_at": {"$lte": now}}, None),
+        ("reqs_db.recoverStaleProcessing(ledger)", "ledger", {"wallet_id": "x", "id": "y"}, None),
+        ("analytics_db.recordRollups(wallet)", "wallet_daily", {"wallet_id": "x", "day": now[:10]}, None),
+        ("analytics_db.recordRollups(platform)", "platform_hourly", {"hour": now[:13]}, None),
+        ("analytics_db.walletDailyRollups", "wallet_daily", {"wallet_id": "x", "day": {"$gte": now[:10]}}, {"day": -1}),
+        ("analytics_db.platformHourlyRollups", "platform_hourly", {"hour": {"$gte": now[:13]}}, {"hour": -1}),
+    ]
+
+
+def _stages(plan: dict) -> list[str]:
+    stages = [plan.get("stage", "")]
+    for child in ("inputStage", "outerStage", "innerStage"):
+        if child in plan:
+            stages += _stages(plan[child])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return stages
+
+
+async def explain_report() -> list[dict]:
+    db = get_db()
+    report = []
+    for label, collection, query, sort in _queryPlans():
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = sort
+        explained = await db.command("explain", command, verbosity="queryPlanner")
+        winning = explained["queryPlanner"]["winningPlan"]
+        winning = winning.get("queryPlan", winning)
+        stages = _stages(winning)
+        report.append({
+            "query": label,
+            "collection": collection,
+            "stages": stages,
+            "uses_index": "COLLSCAN" not in stages,
+            "in_memory_sort": "SORT" in stages,
+        })
+    return report
+
+
+async def main(explain: bool):
+    await initDB()
+    try:
+        summary = await create_indexes()
+        for name, result in summary.items():
+            print(f"{name}: created {result['created'] or 'none'}; rebuilt {result['rebuilt'] or 'none'}; "
+                  f"dropped {result['dropped'] or 'none'}; unmanaged {result['unmanaged'] or 'none'}")
+        if explain:
+            for row in await explain_report():
+                status = "ok" if row["uses_index"] and not row["in_memory_sort"] else "CHECK"
+                print(f"[{status}] {row['query']}: {' > '.join(row['stages'])}")
+    finally:
+        client = get_client()
+        if client is not None:
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build missing MongoDB indexes and report query plans.")
+    parser.add_argument("--explain", action="store_true", help="print the winning plan of every query in reqs_db, transaction_db and analytics_db")
+    args = parser.parse_args()
+    asyncio.run(main(args.explain))
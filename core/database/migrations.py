@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import BulkWriteError
+from core.database.db import initDB, get_db, get_client
+from core.database.analytics_db import platformHourlyPipeline, walletDailyPipeline
+from core.database.indexes import create_indexes
+from core.database.transaction_db import countTransactions
+from core.models.models import QRPaymentRequest
+
+# legacy requests carried no expiry; they get the default lifetime of a new request
+LEGACY_REQUEST_TTL = timedelta(minutes=QRPaymentRequest.model_fields["expires_in_minutes"].default)
+
+
+async def _insertBatch(collection, batch: list) -> int:
+    try:
+        result = await collection.insert_many(batch, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        # entries already copied by an earlier, interrupted run are skipped
+        errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+        if errors:
+            raise
+        return e.details.get("nInserted", 0)
+
+
+async def migrateLedger(batch_size: int = 500) -> dict:
+    db = get_db()
+    users_migrated = 0
+    entries_moved = 0
+    cursor = db.users.find(
+        {"transactions": {"$exists": True}},
+        {"wallet_id": 1, "transactions": 1},
+        batch_size=1
+    )
+    async for user_doc in cursor:
+        wallet_id = user_doc["wallet_id"]
+        txs = user_doc.get("transactions") or []
+        batch = []
+        for tx in txs:
+            tx["wallet_id"] = wallet_id
+            batch.append(tx)
+            if len(batch) >= batch_size:
+                entries_moved += await _insertBatch(db.ledger, batch)
+                batch = []
+        if batch:
+            entries_moved += await _insertBatch(db.ledger, batch)
+
+        await db.users.update_one(
+            {"_id": user_doc["_id"]},
+            {"$unset": {"transactions": ""}, "$inc": {"transactions_count": len(txs)}}
+        )
+        users_migrated += 1
+
+    return {"users_migrated": users_migrated, "entries_moved": entries_moved}
+
+
+async def backfillTransactionCounts(batch_size: int = 500) -> dict:
+    db = get_db()
+    users_updated = 0
+    cursor = db.users.find({"transactions_count": {"$exists": False}}, {"wallet_id": 1}, batch_size=batch_size)
+    async for user_doc in cursor:
+        count = await countTransactions(user_doc["wallet_id"])
+        await db.users.update_one(
+            {"_id": user_doc["_id"], "transactions_count": {"$exists": False}},
+            {"$set": {"transactions_count": count}}
+        )
+        users_updated += 1
+    return {"users_updated": users_updated}
+
+
+def _legacyExpiry(created_at: str | None) -> str:
+    try:
+        created = datetime.fromisoformat(created_at)
+    except (TypeError, ValueError):
+        created = datetime.now(timezone.utc)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return (created + LEGACY_REQUEST_TTL).astimezone(timezone.utc).isoformat()
+
+
+async def migratePaymentRequests(batch_size: int = 500) -> dict:
+    db = get_db()
+    wallets_migrated = 0
+    requests_moved = 0
+    cursor = db.transactionsreq.find(
+        {"transaction_requests": {"$exists": True}},
+        {"wallet_id": 1, "transaction_requests": 1},
+        batch_size=1
+    )
+    async for wallet_doc in cursor:
+        batch = []
+        for req in wallet_doc.get("transaction_requests") or []:
+            req.setdefault("recipient_id", wallet_doc["wallet_id"])
+            if not req.get("expires_at"):
+                req["expires_at"] = _legacyExpiry(req.get("created_at"))
+            batch.append(req)
+            if len(batch) >= batch_size:
+                requests_moved += await _insertBatch(db.payment_requests, batch)
+                batch = []
+        if batch:
+            requests_moved += await _insertBatch(db.payment_requests, batch)
+
+        await db.transactionsreq.update_one({"_id": wallet_doc["_id"]}, {"$unset": {"transaction_requests": ""}})
+        wallets_migrated += 1
+
+    # requests copied by an earlier run of this migration, before it set expires_at
+    expiry_backfilled = 0
+    async for req in db.payment_requests.find({"expires_at": None}, {"request_id": 1, "created_at": 1}, batch_size=batch_size):
+        await db.payment_requests.update_one(
+            {"_id": req["_id"], "expires_at": None},
+            {"$set": {"expires_at": _legacyExpiry(req.get("created_at"))}}
+        )
+        expiry_backfilled += 1
+
+    return {"wallets_migrated": wallets_migrated, "requests_moved": requests_moved, "expiry_backfilled": expiry_backfilled}
+
+
+async def rebuildRollups(batch_size: int = 500) -> dict:
+    # $out swaps each rollup collection in one step, keeping its indexes; entries
+    # written while the aggregation runs are only counted if writes are paused.
+    db = get_db()
+    for pipeline in (walletDailyPipeline(), platformHourlyPipeline()):
+        await db.ledger.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size).to_list(length=None)
+    return {
+        "wallet_days": await db.wallet_daily.estimated_document_count(),
+        "platform_hours": await db.platform_hourly.estimated_document_count(),
+    }
+
+
+MIGRATIONS = {
+    "ledger": migrateLedger,
+    "counters": backfillTransactionCounts,
+    "payment_requests": migratePaymentRequests,
+    "rollups": rebuildRollups,
+}
+
+
+async def main(name: str, batch_size: int):
+    await initDB()
+    try:
+        # re-runs rely on the unique indexes (e.g. ledger (wallet_id, id)) to skip what was already copied
+        if not await create_indexes():
+            raise RuntimeError("Could not ensure indexes; not running the migration")
+        result = await MIGRATIONS[name](batch_size=batch_size)
+        print(f"Migration '{name}' finished: {result}")
+    finally:
+        client = get_client()
+        if client is not None:
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run RaxWallet data migrations.")
+    parser.add_argument("name", choices=sorted(MIGRATIONS))
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.name, args.batch_size))
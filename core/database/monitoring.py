@@ -0,0 +1,147 @@
+import functools
+import threading
+from contextvars import ContextVar
+from pymongo import monitoring
+from core.utlis.metrics import MONGO_COMMAND_FAILURES, MONGO_COMMAND_LATENCY
+
+# Motor runs each operation in an executor with a copy of the caller's context,
+# so the command listener below sees the repository function that issued it.
+db_caller: ContextVar[str] = ContextVar("db_caller", default="other")
+
+
+class RequestDbStats:
+    """Command count and server time for one HTTP request; written from Motor's executor threads."""
+
+    __slots__ = ("_lock", "commands", "seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.seconds = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.commands += 1
+            self.seconds += seconds
+
+
+db_request_stats: ContextVar[RequestDbStats | None] = ContextVar("db_request_stats", default=None)
+
+
+def dbCaller(fn):
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = db_caller.set(name)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            db_caller.reset(token)
+    return wrapper
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """Feeds every MongoDB command's round-trip time into the command latency histogram
+    and, inside an HTTP request, into that request's RequestDbStats."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, db_caller.get()).inc()
+
+    @staticmethod
+    def _record(event):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_LATENCY.labels(event.command_name, db_caller.get()).observe(seconds)
+        stats = db_request_stats.get()
+        if stats is not None:
+            stats.record(seconds)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool usage per server so pool sizes can be tuned from data.
+
+    pymongo calls listeners from its own threads, so counters are guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: dict[str, dict] = {}
+
+    def _server(self, address) -> dict:
+        key = f"{address[0]}:{address[1]}"
+        server = self._servers.get(key)
+        if server is None:
+            server = self._servers[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "wait_seconds_total": 0.0,
+                "wait_seconds_max": 0.0,
+                "pool_cleared": 0,
+            }
+        return server
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(stats) for address, stats in self._servers.items()}
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)["pool_cleared"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._server(event.address)["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["checkout_failures"] += 1
+            self._recordWait(server, event.duration)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["checked_out"] += 1
+            server["checkouts"] += 1
+            self._recordWait(server, event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._server(event.address)["checked_out"] -= 1
+
+    @staticmethod
+    def _recordWait(server: dict, duration: float | None):
+        if duration is None:
+            return
+        server["wait_seconds_total"] += duration
+        server["wait_seconds_max"] = max(server["wait_seconds_max"], duration)
@@ -1,10 +1,26 @@
-from datetime import datetime, timezone
-from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
 from core.database.db import get_db
+from core.database.monitoring import dbCaller
+from core.utlis.broker import get_broker
 from core.utlis.validation import validate_wallet_id, validate_request_id, validate_amount
-from core.utlis.error import ValidationError , TransactionRequestedError
+from core.utlis.error import ValidationError , TransactionRequestedError, TransactionNotFoundError, TransactionStateConflictError
 
-async def transactionRequest(req_id: str, recipient_id: str, recipient_username: str, amount: str, status: str, sender_wallet_id: str = None, sender_username: str = None) -> bool | str:
+REQUEST_TRANSITIONS = {
+    "pending": {"processing", "completed", "rejected", "cancelled", "expired", "failed"},
+    "processing": {"pending", "completed", "failed", "review"},
+    "review": {"pending", "completed", "failed"},
+}
+
+
+def _withExpiry(req: dict | None, now: str = None) -> dict | None:
+    if req and req.get("status") == "pending" and req.get("expires_at"):
+        if req["expires_at"] <= (now or datetime.now(timezone.utc).isoformat()):
+            req["status"] = "expired"
+    return req
+
+@dbCaller
+async def transactionRequest(req_id: str, recipient_id: str, recipient_username: str, amount: str, status: str, sender_wallet_id: str = None, sender_username: str = None, expires_at: str = None, description: str = "") -> bool | str:
       try:
           db = get_db()
           if validate_request_id(req_id) is None:
@@ -16,11 +32,7 @@ async def transactionRequest(req_id: str, recipient_id: str, recipient_username:
           if status is None or status.strip() == "":
               raise ValidationError("Status is required")
 
-          existing_req = await findTransactionRequests(req_id, recipient_id)
-
-          if existing_req:
-              return True
-
+          now = datetime.now(timezone.utc).isoformat()
           tx_request = {
               "request_id": req_id,
               "recipient_id": recipient_id,
@@ -29,51 +41,38 @@ async def transactionRequest(req_id: str, recipient_id: str, recipient_username:
               "sender_username": sender_username or "",
               "amount": amount,
               "status": status.lower(),
-              "created_at": datetime.now(timezone.utc).isoformat(),
-              "updated_at": datetime.now(timezone.utc).isoformat()
+              "description": description or "",
+              "expires_at": expires_at,
+              "created_at": now,
+              "updated_at": now
           }
 
-          await isInDB(recipient_id)
-
-          result = await db.transactionsreq.update_one(
-              {"wallet_id": recipient_id},
-                 {
-                  "$push":
-                      {"transaction_requests":
-                          {
-                            "$each": [tx_request],
-                            "$position": 0
-                         }
-                      }
-                  },
+          result = await db.payment_requests.update_one(
+              {"request_id": req_id},
+              {"$setOnInsert": tx_request},
               upsert=True
-              )
-          return result.modified_count > 0 or result.upserted_id is not None
+          )
+          return result.matched_count > 0 or result.upserted_id is not None
       except ValidationError as e:
           raise ValidationError(e)
 
       except Exception as e:
           raise TransactionRequestedError(e)
 
+@dbCaller
 async def filterTransactionRequests(wallet_id: str, status: str = None, date: str = None) -> list | None:
     try:
         db = get_db()
         if validate_wallet_id(wallet_id) is None:
             raise ValidationError("Wallet ID is required")
-        query = {"wallet_id": wallet_id}
+        query = {"recipient_id": wallet_id}
         if status is not None and status.strip() != "":
-            query["transaction_requests.status"] = status.lower()
+            query["status"] = status.lower()
         if date is not None and date.strip() != "":
-            query["transaction_requests.created_at"] = date
-        user_doc = await db.transactionsreq.find_one(query)
-        if not user_doc or "transaction_requests" not in user_doc:
-            return []
-        requests = user_doc["transaction_requests"]
-        if status:
-            requests = [req for req in requests if req.get("status") == status.lower()]
-        if date:
-            requests = [req for req in requests if req.get("created_at") == date]
-        return requests
+            query["created_at"] = date
+        cursor = db.payment_requests.find(query, {"_id": 0}).sort("created_at", -1)
+        now = datetime.now(timezone.utc).isoformat()
+        return [_withExpiry(req, now) for req in await cursor.to_list(length=None)]
     except ValidationError as e:
         raise ValidationError(e)
     except Exception as e:
@@ -82,6 +81,7 @@ async def filterTransactionRequests(wallet_id: str, status: str = None, date: st
 
 
 
+@dbCaller
 async def findTransactionRequests(request_id: str, wallet_id: str = None) -> dict | None:
 
       try:
@@ -91,22 +91,10 @@ async def findTransactionRequests(request_id: str, wallet_id: str = None) -> dic
           if not request_id or not request_id.strip():
               return None
 
+          query = {"request_id": request_id}
           if wallet_id and wallet_id.strip():
-              user_doc = await db.transactionsreq.find_one(
-                  {"wallet_id": wallet_id, "transaction_requests.request_id": request_id},
-                  {"transaction_requests.$": 1}
-              )
-              if user_doc and "transaction_requests" in user_doc:
-                  return user_doc["transaction_requests"][0]
-          else:
-              user_doc = await db.transactionsreq.find_one(
-                  {"transaction_requests.request_id": request_id},
-                  {"transaction_requests.$": 1}
-              )
-              if user_doc and "transaction_requests" in user_doc:
-                  return user_doc["transaction_requests"][0]
-
-          return None
+              query["recipient_id"] = wallet_id
+          return _withExpiry(await db.payment_requests.find_one(query, {"_id": 0}))
       except ValidationError as e:
           raise ValidationError(e)
 
@@ -115,95 +103,120 @@ async def findTransactionRequests(request_id: str, wallet_id: str = None) -> dic
 
 
 
-async def updateTransactionRequest(request_id: str, wallet_id: str, status: str, sender_wallet_id: str = None, sender_username: str = None) -> bool:
+@dbCaller
+async def transitionTransactionRequest(request_id: str, from_status: str | list[str], to_status: str, wallet_id: str = None, sender_wallet_id: str = None, sender_username: str = None) -> dict:
     try:
         db = get_db()
         if validate_request_id(request_id) is None:
-            return False
-        if validate_wallet_id(wallet_id) is None:
-            return False
-        if not validate_amount(status):
-            return False
-        if not request_id or not request_id.strip():
-            return False
-        if not status or not status.strip():
-            return False
-        valid_statuses = ["pending", "approved", "rejected", "completed", "cancelled"]
-
-        if status.lower() not in valid_statuses:
-           raise ValidationError(f"Status must be one of: {', '.join(valid_statuses)}")
-
+            raise ValidationError("Request ID is required")
+        to_status = to_status.lower()
+        from_statuses = [from_status] if isinstance(from_status, str) else list(from_status)
+        for status in from_statuses:
+            if to_status not in REQUEST_TRANSITIONS.get(status, ()):
+                raise ValidationError(f"Cannot move a payment request from {status} to {to_status}")
+
+        now = datetime.now(timezone.utc).isoformat()
+        status_clauses = [{"status": status} for status in from_statuses if status != "pending"]
+        if "pending" in from_statuses:
+            pending_clause = {"status": "pending"}
+            if to_status != "expired":
+                pending_clause["$or"] = [{"expires_at": None}, {"expires_at": {"$gt": now}}]
+            status_clauses.append(pending_clause)
+
+        query = {"request_id": request_id, "$or": status_clauses}
         if wallet_id and wallet_id.strip():
-           req_doc = await findTransactionRequests(request_id, wallet_id)
-           if not req_doc:
-              return False
-           wallet_id = req_doc["recipient_id"]
-        current_req_doc = await findTransactionRequests(request_id, wallet_id)
-        if not current_req_doc:
-           return False
-
-        if current_req_doc["status"] == status.lower():
-            return True
+            query["recipient_id"] = wallet_id
 
         update_fields = {
-        "transaction_requests.$.status": status.lower(),
-        "transaction_requests.$.updated_at": datetime.now(timezone.utc).isoformat()}
-
-        if sender_wallet_id:
-           update_fields["transaction_requests.$.sender_wallet_id"] = sender_wallet_id
-        if sender_username:
-           update_fields["transaction_requests.$.sender_username"] = sender_username
-
-        result = await db.transactionsreq.update_one({"wallet_id": wallet_id , "transaction_requests.request_id": request_id}, {"$set": update_fields}, upsert=True)
-        return result.modified_count > 0 or result.upserted_id is not None
+            "status": to_status,
+            "updated_at": now}
+        if sender_wallet_id is not None:
+            update_fields["sender_wallet_id"] = sender_wallet_id
+        if sender_username is not None:
+            update_fields["sender_username"] = sender_username
+
+        updated = await db.payment_requests.find_one_and_update(
+            query,
+            {"$set": update_fields},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is not None:
+            await get_broker().publish(request_id, updated)
+            return updated
+
+        current = _withExpiry(await db.payment_requests.find_one({"request_id": request_id}, {"_id": 0}), now)
+        if current is None:
+            raise TransactionNotFoundError(request_id)
+        raise TransactionStateConflictError(current)
     except ValidationError as e:
         raise ValidationError(e)
-
+    except (TransactionNotFoundError, TransactionStateConflictError):
+        raise
     except Exception as e:
         raise TransactionRequestedError(e)
 
 
-async def createTransaction(wallet_id: str) -> bool:
-      try:
-          db = get_db()
-          if not wallet_id:
-              return False
-          doc = {
-              "wallet_id": wallet_id,
-              "transaction_requests": [],
-              "created_at": datetime.now(timezone.utc).isoformat(),
-              "updated_at": datetime.now(timezone.utc).isoformat()
-          }
-          result = await db.transactionsreq.insert_one(doc)
-          return bool(result.inserted_id)
-      except DuplicateKeyError:
-              return True
-      except ValidationError as e:
-          raise ValidationError(e)
-      except Exception:
-          raise TransactionRequestedError
-
-
-
-
-async def isInDB(wallet_id: str) -> bool:
-     try:
-         db = get_db()
-         if validate_wallet_id(wallet_id) is None:
-             raise ValidationError("Wallet ID is required")
+@dbCaller
+async def expireDueRequests(batch_size: int = 500) -> list[str]:
+    try:
+        db = get_db()
+        expired = []
+        while True:
+            now = datetime.now(timezone.utc).isoformat()
+            due_query = {"status": "pending", "expires_at": {"$ne": None, "$lte": now}}
+            cursor = db.payment_requests.find(due_query, {"_id": 0, "request_id": 1}).limit(batch_size)
+            request_ids = [req["request_id"] for req in await cursor.to_list(length=batch_size)]
+            if not request_ids:
+                break
+            await db.payment_requests.update_many(
+                {"request_id": {"$in": request_ids}, **due_query},
+                {"$set": {"status": "expired", "updated_at": now}}
+            )
+            expired.extend(request_ids)
+            for request_id in request_ids:
+                await get_broker().publish(request_id, {"request_id": request_id, "status": "expired"})
+            if len(request_ids) < batch_size:
+                break
+        return expired
+    except Exception as e:
+        raise TransactionRequestedError(e)
 
-         user_doc = await db.transactionsreq.find_one({"wallet_id": wallet_id})
-         if  user_doc:
-             return True
-         return await createTransaction(wallet_id)
 
-     except ValidationError as e:
-         raise ValidationError(e)
-     except Exception:
-         raise TransactionRequestedError
+@dbCaller
+async def recoverStaleProcessing(timeout_seconds: float, batch_size: int = 500) -> dict[str, list[str]]:
+    """Settle accepted requests whose worker never finished the processing -> completed move.
 
+    A QR payment's ledger entries carry the request id, so a request with a
+    debit from its sender is completed. A missing entry does not prove the payer
+    was not charged (the transfer may still be running, or its ledger write may
+    have failed), so such a request is parked in review rather than reopened.
+    """
+    try:
+        db = get_db()
+        now = datetime.now(timezone.utc)
+        stale_query = {"status": "processing", "updated_at": {"$lte": (now - timedelta(seconds=timeout_seconds)).isoformat()}}
+        cursor = db.payment_requests.find(stale_query, {"_id": 0, "request_id": 1, "sender_wallet_id": 1}).limit(batch_size)
+        recovered = {"completed": [], "review": []}
+        for req in await cursor.to_list(length=batch_size):
+            request_id = req["request_id"]
+            paid = await db.ledger.find_one({"wallet_id": req.get("sender_wallet_id", ""), "id": request_id}, {"_id": 1})
+            update_fields = {"status": "completed" if paid else "review", "updated_at": now.isoformat()}
+            updated = await db.payment_requests.find_one_and_update(
+                {"request_id": request_id, **stale_query},
+                {"$set": update_fields},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if updated is not None:
+                await get_broker().publish(request_id, updated)
+                recovered[update_fields["status"]].append(request_id)
+        return recovered
+    except Exception as e:
+        raise TransactionRequestedError(e)
 
 
+@dbCaller
 async def getRequests(wallet_id: str , limit: int = 100) -> list:
     try:
         db = get_db()
@@ -213,15 +226,15 @@ async def getRequests(wallet_id: str , limit: int = 100) -> list:
             raise ValidationError("Limit must be a positive integer")
         if limit < 0 or  limit > 1000:
             limit = 100
-        user_doc = await db.transactionsreq.find_one({"wallet_id": wallet_id}, {"transaction_requests.$": 1})
-        if not user_doc or "transaction_requests" not in user_doc:
-            return []
-        return user_doc["transaction_requests"][:limit]
+        cursor = db.payment_requests.find({"recipient_id": wallet_id}, {"_id": 0}).sort("created_at", -1).limit(limit)
+        now = datetime.now(timezone.utc).isoformat()
+        return [_withExpiry(req, now) for req in await cursor.to_list(length=limit)]
     except ValidationError as e:
         raise ValidationError(e)
     except Exception :
         raise TransactionRequestedError
 
+@dbCaller
 async def deleteTransactionRequest(request_id: str, wallet_id: str) -> bool:
     try:
         db = get_db()
@@ -230,21 +243,8 @@ async def deleteTransactionRequest(request_id: str, wallet_id: str) -> bool:
         if not wallet_id or not wallet_id.strip():
             raise ValidationError("Wallet ID is required")
 
-        existing_request = await findTransactionRequests(request_id, wallet_id)
-        if not existing_request:
-            return True
-
-        result = await db.transactionsreq.update_one(
-            {"wallet_id": wallet_id},
-            {"$pull":
-                 {"transaction_requests":
-                      {"request_id": request_id}}
-            },
-            upsert=True
-        )
-
-        success = result.modified_count > 0 or result.upserted_id is not None
-        return success
+        await db.payment_requests.delete_one({"request_id": request_id, "recipient_id": wallet_id})
+        return True
 
     except ValidationError as e:
         raise ValidationError(e)
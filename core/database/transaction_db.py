@@ -1,147 +1,331 @@
+import base64
+import json
+import logging
+import math
 import uuid
 from datetime import datetime, timezone
 from typing import Optional
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from core.database.analytics_db import recordRollups
 from core.database.db import get_db
+from core.database.monitoring import dbCaller
 from core.models.models import UserInDB
+from core.utlis.error import TransactionError, ValidationError
+from core.utlis.user_cache import user_cache
 
+logger = logging.getLogger("raxwallet.ledger")
 
+
+@dbCaller
 async def GetUserByUsername(username: str) -> Optional[UserInDB]:
     db = get_db()
-    user_doc = await db.users.find_one({"username": username})
+    user_doc = await db.users.find_one({"username": username}, {"transactions": 0})
     if user_doc:
         user_doc["_id"] = str(user_doc["_id"])
         return UserInDB(**user_doc)
     return None
 
+@dbCaller
 async def GetUserByWalletId(wallet_id: str) -> Optional[UserInDB]:
     db = get_db()
-    user_doc = await db.users.find_one({"wallet_id": wallet_id})
+    user_doc = await db.users.find_one({"wallet_id": wallet_id}, {"transactions": 0})
     if user_doc:
         user_doc["_id"] = str(user_doc["_id"])
         return UserInDB(**user_doc)
     return None
 
+@dbCaller
 async def GetUserDocByWalletId(wallet_id: str) -> dict | None:
     db = get_db()
-    doc = await db.users.find_one({"wallet_id": wallet_id})
+    doc = await db.users.find_one({"wallet_id": wallet_id}, {"transactions": 0})
     if not doc:
         return None
     doc["_id"] = str(doc["_id"])
     doc.pop("hashed_password", None)
     return doc
 
-async def UpdateUserBalance(user_id: str, new_balance: float) -> bool:
+
+BALANCE_PROJECTION = {"_id": 0, "wallet_id": 1, "balance": 1, "full_name": 1, "username": 1}
+
+
+def _ledgerEntry(wallet_id: str, amount: float, tx_type: str, balance_after: float, tx_id: str = None, timestamp: str = None, **extra) -> dict:
+    tx = {
+        "id": tx_id or str(uuid.uuid4()),
+        "wallet_id": wallet_id,
+        "amount": amount,
+        "type": tx_type,
+        "balance_after": balance_after,
+        "created_at": timestamp or datetime.now(timezone.utc).isoformat()
+    }
+    tx.update(extra)
+    return tx
+
+
+@dbCaller
+async def adjustBalance(wallet_id: str, delta: float) -> dict | None:
+    if not math.isfinite(delta):
+        raise ValidationError("Amount must be a finite number")
     db = get_db()
-    result = await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"balance": new_balance}},
-        upsert=True
+    query = {"wallet_id": wallet_id}
+    if delta < 0:
+        query["balance"] = {"$gte": -delta}
+    user = await db.users.find_one_and_update(
+        query,
+        {"$inc": {"balance": delta, "transactions_count": 1}},
+        projection=BALANCE_PROJECTION,
+        return_document=ReturnDocument.AFTER
     )
-    return result.modified_count > 0 or result.upserted_id is not None
+    if user is not None:
+        user_cache.invalidate(wallet_id=wallet_id)
+    return user
 
-async def UpdateUserBalanceByWalletId(wallet_id: str, new_balance: float) -> bool:
+
+async def _recordLedger(entries: list[dict]):
+    """Append the ledger entries for a balance change that has already been applied.
+
+    The balance is the source of truth once it has moved, so a failed insert is
+    logged with the entries for replay rather than raised: raising would turn a
+    completed change into an error the client retries.
+    """
     db = get_db()
-    result = await db.users.update_one(
+    try:
+        await db.ledger.insert_many(entries)
+    except Exception:
+        logger.exception("Ledger insert failed for applied balance change %s: %s", entries[0]["id"], json.dumps(entries))
+        return
+    await recordRollups(entries)
+
+
+@dbCaller
+async def applyBalanceChange(wallet_id: str, delta: float, tx_type: str) -> dict | None:
+    user = await adjustBalance(wallet_id, delta)
+    if user is None:
+        return None
+    await _recordLedger([_ledgerEntry(wallet_id, delta, tx_type, user["balance"])])
+    return user
+
+
+async def _refund(wallet_id: str, amount: float):
+    db = get_db()
+    await db.users.update_one(
         {"wallet_id": wallet_id},
-        {"$set": {"balance": new_balance}},
-        upsert=True
+        {"$inc": {"balance": amount, "transactions_count": -1}}
     )
-    return result.modified_count > 0 or result.upserted_id is not None
+    user_cache.invalidate(wallet_id=wallet_id)
+
+
+@dbCaller
+async def transferFunds(from_wallet_id: str, to_wallet_id: str, amount: float, tx_id: str = None) -> tuple[dict, dict] | str:
+    """Debit, credit, then record the ledger entries; the debit is refunded if the credit does not happen.
 
+    Once both balances have moved the transfer counts as done, see _recordLedger.
+    """
+    if from_wallet_id == to_wallet_id:
+        raise ValidationError("Cannot send money to your own wallet")
+    from_user = await adjustBalance(from_wallet_id, -amount)
+    if from_user is None:
+        return "insufficient"
+    try:
+        to_user = await adjustBalance(to_wallet_id, amount)
+    except Exception:
+        await _refund(from_wallet_id, amount)
+        raise
+    if to_user is None:
+        await _refund(from_wallet_id, amount)
+        return "recipient"
 
-async def sendMoney(from_wallet_id: str, to_wallet_id: str, amount: float) -> bool:
+    tx_id = tx_id or str(uuid.uuid4())
+    timestamp = datetime.now(timezone.utc).isoformat()
+    entries = [
+        _ledgerEntry(from_wallet_id, -amount, "debit", from_user["balance"], tx_id, timestamp, to_wallet_id=to_wallet_id),
+        _ledgerEntry(to_wallet_id, amount, "credit", to_user["balance"], tx_id, timestamp, from_wallet_id=from_wallet_id)
+    ]
+    await _recordLedger(entries)
+    return from_user, to_user
+
+
+def _planBatch(from_wallet_id: str, balance: float, recipients: dict, transfers: list[dict], timestamp: str) -> tuple[list[dict], list[dict], dict, float]:
+    """Evaluate batch items in order against a running balance: (per-item results, ledger entries, credits per recipient, final balance)."""
+    results = []
+    ledger = []
+    credits = {}
+    recipient_balances = {wallet_id: doc["balance"] for wallet_id, doc in recipients.items()}
+    for index, transfer in enumerate(transfers):
+        to_wallet_id = transfer["to_wallet_id"]
+        amount = transfer["amount"]
+        result = {"index": index, "to_wallet_id": to_wallet_id, "amount": amount}
+        if not math.isfinite(amount) or amount <= 0:
+            result["status"] = "invalid_amount"
+        elif to_wallet_id == from_wallet_id:
+            result["status"] = "invalid_recipient"
+        elif to_wallet_id not in recipient_balances:
+            result["status"] = "recipient_not_found"
+        elif balance < amount:
+            result["status"] = "insufficient_funds"
+        else:
+            tx_id = str(uuid.uuid4())
+            balance -= amount
+            recipient_balances[to_wallet_id] += amount
+            ledger.append(_ledgerEntry(from_wallet_id, -amount, "debit", balance, tx_id, timestamp, to_wallet_id=to_wallet_id))
+            ledger.append(_ledgerEntry(to_wallet_id, amount, "credit", recipient_balances[to_wallet_id], tx_id, timestamp, from_wallet_id=from_wallet_id))
+            credit = credits.setdefault(to_wallet_id, {"amount": 0.0, "count": 0})
+            credit["amount"] += amount
+            credit["count"] += 1
+            result["status"] = "ok"
+            result["transaction_id"] = tx_id
+        results.append(result)
+    return results, ledger, credits, balance
+
+
+async def _applyBatch(session, from_wallet_id: str, transfers: list[dict]) -> tuple[dict, list[dict], list[dict], dict] | None:
+    db = get_db()
+    sender = await db.users.find_one({"wallet_id": from_wallet_id}, BALANCE_PROJECTION, session=session)
+    if not sender:
+        return None
+
+    recipient_ids = list({t["to_wallet_id"] for t in transfers})
+    recipients = {}
+    async for doc in db.users.find({"wallet_id": {"$in": recipient_ids}}, BALANCE_PROJECTION, session=session):
+        recipients[doc["wallet_id"]] = doc
+
+    timestamp = datetime.now(timezone.utc).isoformat()
+    results, ledger, credits, balance = _planBatch(from_wallet_id, sender["balance"], recipients, transfers, timestamp)
+    if not ledger:
+        return sender, results, ledger, credits
+
+    debited = sender["balance"] - balance
+    sent_count = sum(credit["count"] for credit in credits.values())
+    ops = [UpdateOne(
+        {"wallet_id": from_wallet_id, "balance": {"$gte": debited}},
+        {"$inc": {"balance": -debited, "transactions_count": sent_count}}
+    )]
+    for to_wallet_id, credit in credits.items():
+        ops.append(UpdateOne(
+            {"wallet_id": to_wallet_id},
+            {"$inc": {"balance": credit["amount"], "transactions_count": credit["count"]}}
+        ))
+    write_result = await db.users.bulk_write(ops, ordered=True, session=session)
+    if write_result.matched_count != len(ops):
+        raise TransactionError("Wallet balances changed during the batch; nothing was transferred")
+
+    await db.ledger.insert_many(ledger, session=session)
+    sender["balance"] = balance
+    return sender, results, ledger, credits
+
+
+@dbCaller
+async def sendMoneyBatch(from_wallet_id: str, transfers: list[dict]) -> tuple[dict, list[dict]] | None:
     db = get_db()
     async with await db.client.start_session() as session:
-        async with session.start_transaction():
-            from_user = await db.users.find_one({"wallet_id": from_wallet_id}, session=session)
-            to_user = await db.users.find_one({"wallet_id": to_wallet_id}, session=session)
+        # with_transaction reruns the whole read-evaluate-write callback on WriteConflict
+        # and other transient errors, e.g. a concurrent add_funds on the sender.
+        outcome = await session.with_transaction(lambda s: _applyBatch(s, from_wallet_id, transfers))
+    if outcome is None:
+        return None
+    sender, results, ledger, credits = outcome
+    if ledger:
+        await recordRollups(ledger)
+        user_cache.invalidate(wallet_id=from_wallet_id)
+        for to_wallet_id in credits:
+            user_cache.invalidate(wallet_id=to_wallet_id)
+    return sender, results
 
-            if not from_user or not to_user:
-                await session.abort_transaction()
-                return False
 
-            if from_user["balance"] < amount:
-                await session.abort_transaction()
-                return False
+async def streamTransactions(wallet_id: str, since: str = None, until: str = None, batch_size: int = 500):
+    db = get_db()
+    query = {"wallet_id": wallet_id}
+    created_range = {}
+    if since:
+        created_range["$gte"] = since
+    if until:
+        created_range["$lt"] = until
+    if created_range:
+        query["created_at"] = created_range
+    cursor = db.ledger.find(query, {"_id": 0, "wallet_id": 0}, batch_size=batch_size).sort([("created_at", 1), ("_id", 1)])
+    async for tx in cursor:
+        yield tx
 
-            new_from_balance = from_user["balance"] - amount
-            new_to_balance = to_user["balance"] + amount
 
-            from_result = await db.users.update_one(
-                {"wallet_id": from_wallet_id},
-                {"$set": {"balance": new_from_balance}},
-                session=session
-            )
+LEDGER_FIELDS = ("id", "amount", "type", "balance_after", "created_at", "to_wallet_id", "from_wallet_id")
+# transfers used to be recorded as sent/received; they are debit/credit now, and the type filter matches both
+LEGACY_LEDGER_TYPES = {"debit": ["debit", "sent"], "credit": ["credit", "received"], "sent": ["debit", "sent"], "received": ["credit", "received"]}
 
-            to_result = await db.users.update_one(
-                {"wallet_id": to_wallet_id},
-                {"$set": {"balance": new_to_balance}},
-                session=session
-            )
 
-            if from_result.modified_count == 0 or to_result.modified_count == 0:
-                await session.abort_transaction()
-                return False
+def _encodeCursor(tx: dict) -> str:
+    raw = json.dumps({"c": tx["created_at"], "i": str(tx["_id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
 
-            tx_id = str(uuid.uuid4())
-            timestamp = datetime.now(timezone.utc).isoformat()
-
-            sender_tx = {
-                "id": tx_id,
-                "amount": -amount,
-                "type": "sent",
-                "to_wallet_id": to_wallet_id,
-                "balance_after": new_from_balance,
-                "created_at": timestamp
-            }
-
-            receiver_tx = {
-                "id": tx_id,
-                "amount": amount,
-                "type": "received",
-                "from_wallet_id": from_wallet_id,
-                "balance_after": new_to_balance,
-                "created_at": timestamp
-            }
-
-            await db.users.update_one(
-                {"wallet_id": from_wallet_id},
-                {"$push": {"transactions": {"$each": [sender_tx], "$position": 0}}},
-                session=session,
-                upsert=True
-            )
-
-            await db.users.update_one(
-                {"wallet_id": to_wallet_id},
-                {"$push": {"transactions": {"$each": [receiver_tx], "$position": 0}}},
-                session=session,
-                upsert=True
-            )
-
-    return True
-
-async def transactionHistory(wallet_id: str) -> list | None:
+def _decodeCursor(cursor: str) -> tuple[str, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(data["c"]), ObjectId(data["i"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+@dbCaller
+async def listTransactions(wallet_id: str, limit: int = 50, after: str = None, tx_type: str = None,
+                           min_amount: float = None, max_amount: float = None,
+                           since: str = None, until: str = None, fields: list[str] = None) -> tuple[list, str | None]:
     db = get_db()
-    user_doc = await db.users.find_one({"wallet_id": wallet_id}, {"transactions": 1, "_id": 0})
-    if user_doc and "transactions" in user_doc:
-        return user_doc["transactions"]
-    return None
+    query = {"wallet_id": wallet_id}
+    if tx_type:
+        tx_type = tx_type.lower()
+        query["type"] = {"$in": LEGACY_LEDGER_TYPES[tx_type]} if tx_type in LEGACY_LEDGER_TYPES else tx_type
+    if min_amount is not None or max_amount is not None:
+        query["amount"] = {}
+        if min_amount is not None:
+            query["amount"]["$gte"] = min_amount
+        if max_amount is not None:
+            query["amount"]["$lte"] = max_amount
+    created_range = {}
+    if since:
+        created_range["$gte"] = since
+    if until:
+        created_range["$lt"] = until
+    if after:
+        after_created, after_id = _decodeCursor(after)
+        query["$or"] = [
+            {"created_at": {"$lt": after_created}},
+            {"created_at": after_created, "_id": {"$lt": after_id}}
+        ]
+    if created_range:
+        query["created_at"] = created_range
 
+    unknown = [f for f in fields or () if f not in LEDGER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(LEDGER_FIELDS)}")
+    requested = list(fields or LEDGER_FIELDS)
+    projection = {f: 1 for f in requested}
+    projection["created_at"] = 1
 
-async def addTransaction(wallet_id: str, amount: float, tx_type: str, balance_after: float) -> bool:
+    cursor = (db.ledger.find(query, projection)
+              .sort([("created_at", -1), ("_id", -1)])
+              .limit(limit + 1))
+    txs = await cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(txs) > limit:
+        txs = txs[:limit]
+        next_cursor = _encodeCursor(txs[-1])
+    for tx in txs:
+        tx.pop("_id", None)
+        if "created_at" not in requested:
+            tx.pop("created_at", None)
+    return txs, next_cursor
+
+
+@dbCaller
+async def recentTransactions(wallet_id: str, limit: int = 10) -> list:
     db = get_db()
-    tx = {
-        "id": str(uuid.uuid4()),
-        "amount": amount,
-        "type": tx_type,
-        "balance_after": balance_after,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    result = await db.users.update_one(
-        {"wallet_id": wallet_id},
-        {"$push": {"transactions": {"$each": [tx], "$position": 0}}},
-        upsert=True
-    )
-    return result.modified_count > 0 or result.upserted_id is not None
+    cursor = db.ledger.find({"wallet_id": wallet_id}, {"_id": 0, "wallet_id": 0}).sort("created_at", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+@dbCaller
+async def countTransactions(wallet_id: str) -> int:
+    db = get_db()
+    return await db.ledger.count_documents({"wallet_id": wallet_id})
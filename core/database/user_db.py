@@ -1,19 +1,23 @@
 from typing import Optional
 from pymongo.errors import DuplicateKeyError
 from core.database.db import get_db
+from core.database.monitoring import dbCaller
 from core.models.models import UserInDB
 from core.utlis.walletex import WalletEx
+from core.utlis.user_cache import user_cache
 
 
+@dbCaller
 async def LoginUser(username: str) -> Optional[UserInDB]:
     db = get_db()
-    user_doc = await db.users.find_one({"username": username})
+    user_doc = await db.users.find_one({"username": username}, {"transactions": 0})
     if user_doc:
         user_doc["_id"] = str(user_doc["_id"])
         return UserInDB(**user_doc)
     return None
 
 
+@dbCaller
 async def RegisterUser(phoneNumber: str, username: str, hashed_password: str, email: str, full_name: str) -> bool | str:
     db = get_db()
     ext = WalletEx()
@@ -27,7 +31,7 @@ async def RegisterUser(phoneNumber: str, username: str, hashed_password: str, em
         "email": email,
         "full_name": full_name,
         "balance": 0.0,
-        "transactions": []
+        "transactions_count": 0
     }
 
     try:
@@ -45,23 +49,12 @@ async def RegisterUser(phoneNumber: str, username: str, hashed_password: str, em
             return "duplicate"
 
 
-async def create_indexes():
-    try:
-        db = get_db()
-        await db.users.create_index("email", unique=True)
-        await db.users.create_index("username", unique=True)
-        await db.users.create_index("phoneNumber", unique=True)
-        await db.users.create_index("wallet_id", unique=True)
-        print("Database indexes created successfully")
-    except Exception as e:
-        print(f"Error creating indexes: {e}")
-
-
+@dbCaller
 async def GetUserById(user_id: str) -> Optional[UserInDB]:
     db = get_db()
     try:
         from bson import ObjectId
-        user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
+        user_doc = await db.users.find_one({"_id": ObjectId(user_id)}, {"transactions": 0})
         if user_doc:
             user_doc["_id"] = str(user_doc["_id"])
             return UserInDB(**user_doc)
@@ -70,6 +63,7 @@ async def GetUserById(user_id: str) -> Optional[UserInDB]:
     return None
 
 
+@dbCaller
 async def UpdateUserProfile(user_id: str, update_data: dict) -> bool:
     db = get_db()
     try:
@@ -79,6 +73,7 @@ async def UpdateUserProfile(user_id: str, update_data: dict) -> bool:
             {"$set": update_data},
             upsert=True
         )
+        user_cache.invalidate(user_id=user_id)
         return result.modified_count > 0 or result.upserted_id is not None
     except Exception as e:
         print(f"Error updating user profile: {e}")
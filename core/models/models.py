@@ -40,6 +40,13 @@ class PaymentRequest(BaseModel):
     to_wallet_id: str
     amount: float
 
+class BatchTransferItem(BaseModel):
+    to_wallet_id: str
+    amount: float
+
+class BatchTransferRequest(BaseModel):
+    transfers: list[BatchTransferItem] = Field(min_length=1, max_length=500)
+
 class PaymentResponse(BaseModel):
     transaction_id: str
 
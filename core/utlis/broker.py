@@ -0,0 +1,58 @@
+import asyncio
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+
+
+class StatusBroker(ABC):
+    """Fan-out of payment request status changes to the connections waiting on them.
+
+    The in-memory broker only reaches subscribers in the same process; while it
+    is installed the event stream also re-reads the request on each heartbeat.
+    A shared backend (e.g. Redis pub/sub) installed with set_broker() delivers
+    every transition, including the sweeper's expiries, so the re-read is skipped.
+    """
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str):
+        ...
+
+
+class InMemoryBroker(StatusBroker):
+    def __init__(self, max_queue: int = 16):
+        self.max_queue = max_queue
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+
+    async def publish(self, channel: str, message: dict):
+        for queue in list(self._subscribers.get(channel, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    self._subscribers.pop(channel, None)
+
+
+_broker: StatusBroker = InMemoryBroker()
+
+
+def get_broker() -> StatusBroker:
+    return _broker
+
+
+def set_broker(broker: StatusBroker):
+    global _broker
+    _broker = broker
@@ -16,3 +16,10 @@ class TransactionAlreadyInPool(TransactionError):
 class TransactionRequestedError(TransactionError):
     pass
 
+class TransactionStateConflictError(TransactionError):
+    def __init__(self, current: dict):
+        super().__init__(f"Payment request is {current.get('status')}")
+        self.current = current
+
+class PasswordPoolBusyError(Error):
+    pass
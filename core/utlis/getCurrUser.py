@@ -5,6 +5,7 @@ from jose import jwt, JWTError
 from config import Config
 from core.database.transaction_db import GetUserByUsername
 from core.models.models import UserInDB
+from core.utlis.user_cache import user_cache
 
 oauth2= OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -27,7 +28,12 @@ async def getUser(token: str = Depends(oauth2)) -> UserInDB:
     except JWTError:
         raise invalid
 
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+
     user = await GetUserByUsername(username=username)
     if user is None:
         raise invalid
+    user_cache.set(user)
     return user
\ No newline at end of file
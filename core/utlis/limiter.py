@@ -1,4 +1,40 @@
-from slowapi import Limiter
+from fastapi import Request
+from jose import jwt, JWTError
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
+from config import Config
+from core.utlis.metrics import RATE_LIMIT_REJECTIONS, route_label
 
-limiter = Limiter(key_func=get_remote_address)
+
+def rate_limit_key(request: Request) -> str:
+    auth = request.headers.get("authorization", "")
+    scheme, _, token = auth.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            payload = jwt.decode(
+                token,
+                Config.secret_key,
+                algorithms=[Config.ALGORITHM],
+                audience=Config.AUDIENCE,
+                issuer=Config.ISSUER
+            )
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    return f"ip:{get_remote_address(request)}"
+
+
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=Config.RATE_LIMIT_STORAGE_URI,
+    strategy=Config.RATE_LIMIT_STRATEGY,
+    key_prefix=Config.RATE_LIMIT_KEY_PREFIX,
+    in_memory_fallback_enabled=Config.RATE_LIMIT_STORAGE_URI != "memory://"
+)
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    RATE_LIMIT_REJECTIONS.labels(route_label(request.app, request.scope)).inc()
+    return _rate_limit_exceeded_handler(request, exc)
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+from typing import Callable
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match, Mount
+from config import Config
+
+HTTP_LATENCY = Histogram(
+    "raxwallet_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"]
+)
+HTTP_IN_PROGRESS = Gauge(
+    "raxwallet_http_requests_in_progress",
+    "HTTP requests currently being served.",
+    ["method"],
+    multiprocess_mode="livesum"
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "raxwallet_mongo_command_duration_seconds",
+    "MongoDB command round-trip time by command and calling repository function.",
+    ["command", "caller"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "raxwallet_mongo_command_failures_total",
+    "MongoDB commands that returned an error.",
+    ["command", "caller"]
+)
+LOOP_LAG = Gauge(
+    "raxwallet_event_loop_lag_seconds",
+    "How late the most recent event loop probe woke up.",
+    multiprocess_mode="max"
+)
+LOOP_LAG_HISTOGRAM = Histogram(
+    "raxwallet_event_loop_lag_distribution_seconds",
+    "Distribution of event loop probe lateness.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+DB_COMMANDS_PER_REQUEST = Histogram(
+    "raxwallet_http_request_db_commands",
+    "MongoDB commands issued while serving one HTTP request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34)
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "raxwallet_rate_limit_rejections_total",
+    "Requests rejected by the rate limiter.",
+    ["route"]
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+_runtime_collectors = []
+
+
+def route_label(app, scope) -> str:
+    """Route template for a request, so /payments/request_status/{request_id} is one series, not one per id.
+
+    Call it after dispatch: FastAPI puts the matched route in the scope, and only
+    mounts and unmatched paths fall back to scanning the route table. A mount has
+    already moved its prefix into root_path by then, so it is found by the app it
+    dispatched to instead.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    endpoint = scope.get("endpoint")
+    for route in app.router.routes:
+        if endpoint is not None and isinstance(route, Mount) and route.app is endpoint:
+            return route.path
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template and in-flight requests per method."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def sendWithStatus(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        # The route is only known once the router has matched, so in-flight requests are counted per method.
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, sendWithStatus)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            HTTP_LATENCY.labels(method, route_label(scope["app"], scope), str(status)).observe(elapsed)
+
+
+class RuntimeCollector:
+    """Reads the Mongo pool and password pool counters at scrape time instead of on every event."""
+
+    def __init__(self, mongo_pool_stats: Callable[[], dict], password_pool_stats: Callable[[], dict]):
+        self.mongo_pool_stats = mongo_pool_stats
+        self.password_pool_stats = password_pool_stats
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        pool_gauges = {
+            "open": GaugeMetricFamily("raxwallet_mongo_pool_connections", "Open connections per server.", labels=["address"]),
+            "checked_out": GaugeMetricFamily("raxwallet_mongo_pool_checked_out", "Connections checked out per server.", labels=["address"]),
+        }
+        pool_counters = {
+            "checkouts": CounterMetricFamily("raxwallet_mongo_pool_checkouts", "Connection checkouts per server.", labels=["address"]),
+            "checkout_failures": CounterMetricFamily("raxwallet_mongo_pool_checkout_failures", "Failed connection checkouts per server.", labels=["address"]),
+            "wait_seconds_total": CounterMetricFamily("raxwallet_mongo_pool_wait_seconds", "Time spent waiting for a connection per server.", labels=["address"]),
+            "pool_cleared": CounterMetricFamily("raxwallet_mongo_pool_cleared", "Times the pool was cleared per server.", labels=["address"]),
+        }
+        for address, stats in self.mongo_pool_stats().items():
+            for key, family in {**pool_gauges, **pool_counters}.items():
+                family.add_metric([address], stats[key])
+        yield from pool_gauges.values()
+        yield from pool_counters.values()
+
+        password = self.password_pool_stats()
+        for key in ("workers", "in_flight", "queue_depth", "queue_limit"):
+            gauge = GaugeMetricFamily(f"raxwallet_password_pool_{key}", f"Password hashing pool {key.replace('_', ' ')}.")
+            gauge.add_metric([], password[key])
+            yield gauge
+        rejected = CounterMetricFamily("raxwallet_password_pool_rejected", "Password hashing calls rejected because the pool was saturated.")
+        rejected.add_metric([], password["rejected"])
+        yield rejected
+        calls = CounterMetricFamily("raxwallet_password_pool_calls", "Password hash and verify calls.", labels=["kind"])
+        seconds = CounterMetricFamily("raxwallet_password_pool_seconds", "Time spent in password hash and verify calls.", labels=["kind"])
+        for kind in ("hash", "verify"):
+            calls.add_metric([kind], password[kind]["count"])
+            seconds.add_metric([kind], password[kind]["seconds_total"])
+        yield calls
+        yield seconds
+
+
+def register_runtime_collector(collector: RuntimeCollector):
+    REGISTRY.register(collector)
+    _runtime_collectors.append(collector)
+
+
+async def monitorLoopLag(interval: float = None):
+    interval = interval or Config.METRICS_LOOP_LAG_INTERVAL_SECONDS
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HISTOGRAM.observe(lag)
+
+
+def metrics_response(request: Request) -> Response:
+    if Config.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {Config.METRICS_TOKEN}":
+        return Response(status_code=401)
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # With several workers each process writes its own files; merge them per scrape.
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        for collector in _runtime_collectors:
+            registry.register(collector)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,103 @@
+import asyncio
+import cProfile
+import hmac
+import logging
+import os
+import time
+import uuid
+from starlette.datastructures import Headers, MutableHeaders
+from config import Config
+from core.database.monitoring import RequestDbStats, db_request_stats
+from core.utlis.metrics import DB_COMMANDS_PER_REQUEST, route_label
+
+logger = logging.getLogger("raxwallet.requests")
+
+# cProfile hooks the whole event loop thread, so only one request is profiled at a time.
+_profiling = False
+
+
+def server_timing(stats: RequestDbStats, elapsed: float) -> str:
+    return (
+        f'db;dur={stats.seconds * 1000:.1f};desc="{stats.commands} commands", '
+        f"app;dur={elapsed * 1000:.1f}"
+    )
+
+
+def _profileRequested(scope) -> bool:
+    if not Config.PROFILE_TOKEN or _profiling:
+        return False
+    token = Headers(scope=scope).get("x-profile-token")
+    return token is not None and hmac.compare_digest(token, Config.PROFILE_TOKEN)
+
+
+def _saveProfile(profiler: cProfile.Profile, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    profiler.dump_stats(path)
+
+
+class RequestTimingMiddleware:
+    """Counts MongoDB commands and their time per request.
+
+    The totals go out in a Server-Timing header, into the per-route DB command
+    histogram and, above SLOW_REQUEST_MS, into the slow request log. Streamed
+    responses (SSE, exports) are judged on the time to their response headers,
+    since they stay open by design. A request
+    carrying X-Profile-Token equal to PROFILE_TOKEN is run under cProfile and
+    the stats are written to PROFILE_DIR under the id returned in X-Profile-Id.
+    Anything else the loop runs meanwhile shows up in that profile too.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _profiling
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats()
+        token = db_request_stats.set(stats)
+        profiler = profile_id = None
+        if _profileRequested(scope):
+            _profiling = True
+            profile_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+            profiler = cProfile.Profile()
+            profiler.enable()
+        status = 500
+        start = time.perf_counter()
+        headers_sent = None
+        streamed = False
+
+        async def sendWithTiming(message):
+            nonlocal status, headers_sent, streamed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers_sent = time.perf_counter() - start
+                headers = MutableHeaders(scope=message)
+                if Config.SERVER_TIMING:
+                    headers.append("Server-Timing", server_timing(stats, time.perf_counter() - start))
+                if profile_id:
+                    headers.append("X-Profile-Id", profile_id)
+            elif message["type"] == "http.response.body" and message.get("more_body"):
+                streamed = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendWithTiming)
+        finally:
+            elapsed = time.perf_counter() - start
+            db_request_stats.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                _profiling = False
+                await asyncio.to_thread(_saveProfile, profiler, os.path.join(Config.PROFILE_DIR, f"{profile_id}.prof"))
+            route = route_label(scope["app"], scope)
+            DB_COMMANDS_PER_REQUEST.labels(route).observe(stats.commands)
+            judged = headers_sent if streamed and headers_sent is not None else elapsed
+            if judged * 1000 >= Config.SLOW_REQUEST_MS:
+                logger.warning(
+                    "slow request %s %s status=%s duration_ms=%.1f first_byte_ms=%.1f db_commands=%d db_ms=%.1f",
+                    scope["method"], route, status, elapsed * 1000, (headers_sent or elapsed) * 1000,
+                    stats.commands, stats.seconds * 1000
+                )
@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+import io
+from collections import OrderedDict
+import qrcode
+from qrcode.image.svg import SvgPathImage
+from config import Config
+
+QR_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def _render(payload: str, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "svg":
+        qrcode.make(payload, image_factory=SvgPathImage).save(buf)
+    else:
+        qrcode.make(payload).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def qr_etag(request_id: str, host: str, fmt: str) -> str:
+    digest = hashlib.sha1(f"{request_id}|{host}|{fmt}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+class QRCodeCache:
+    """LRU of rendered QR images bounded by total bytes; rendering runs in the default executor."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._images: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size = 0
+        self._pending: dict[tuple, asyncio.Future] = {}
+
+    async def get(self, request_id: str, host: str, fmt: str, payload: str) -> bytes:
+        key = (request_id, host, fmt)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            return image
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().run_in_executor(None, _render, payload, fmt)
+        self._pending[key] = future
+        try:
+            image = await future
+        finally:
+            self._pending.pop(key, None)
+        self._store(key, image)
+        return image
+
+    def _store(self, key: tuple, image: bytes):
+        if len(image) > self.max_bytes:
+            return
+        self._images[key] = image
+        self._size += len(image)
+        while self._size > self.max_bytes:
+            _, evicted = self._images.popitem(last=False)
+            self._size -= len(evicted)
+
+
+qr_cache = QRCodeCache(Config.QR_CACHE_MAX_BYTES)
@@ -0,0 +1,15 @@
+from typing import Any
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+class JSONResponse(Response):
+    """JSON response rendered with orjson; Pydantic models are serialized straight to bytes."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return type(content).__pydantic_serializer__.to_json(content, by_alias=True)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -1,13 +1,53 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
+from config import Config
+from core.utlis.error import PasswordPoolBusyError
 
 password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL while hashing, so a small thread pool keeps it off the event loop.
+_executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_in_flight = 0
+_stats = {
+    "hash": {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0},
+    "verify": {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0},
+    "rejected": 0,
+}
 
-async def hash_password(password: str) -> str:
-    return password_context.hash(password)
 
+async def _run(kind: str, fn, *args):
+    global _in_flight
+    if _in_flight >= Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_QUEUE_SIZE:
+        _stats["rejected"] += 1
+        raise PasswordPoolBusyError("Password hashing pool is saturated")
+    _in_flight += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _in_flight -= 1
+        elapsed = time.perf_counter() - start
+        stats = _stats[kind]
+        stats["count"] += 1
+        stats["seconds_total"] += elapsed
+        stats["seconds_max"] = max(stats["seconds_max"], elapsed)
 
-async def check_password(plain_password: str, hashed_password: str) -> bool:
+
+def password_pool_stats() -> dict:
+    return {
+        "workers": Config.PASSWORD_HASH_WORKERS,
+        "in_flight": _in_flight,
+        "queue_depth": max(0, _in_flight - Config.PASSWORD_HASH_WORKERS),
+        "queue_limit": Config.PASSWORD_HASH_QUEUE_SIZE,
+        "rejected": _stats["rejected"],
+        "hash": dict(_stats["hash"]),
+        "verify": dict(_stats["verify"]),
+    }
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
     try:
         return password_context.verify(plain_password, hashed_password)
     except Exception as e:
@@ -15,3 +55,9 @@ async def check_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
+async def hash_password(password: str) -> str:
+    return await _run("hash", password_context.hash, password)
+
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run("verify", _verify, plain_password, hashed_password)
@@ -0,0 +1,141 @@
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+from pathlib import Path
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+STATIC_DIR = Path("static")
+DIST_DIR = STATIC_DIR / "dist"
+ASSET_SUFFIXES = (".js", ".css")
+ASSET_URL_PREFIX = "/assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _compress(data: bytes) -> dict[str, bytes]:
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        variants["br"] = brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    return variants
+
+
+def _writeVariants(path: Path, data: bytes):
+    path.write_bytes(data)
+    for encoding, compressed in _compress(data).items():
+        suffix = ".gz" if encoding == "gzip" else ".br"
+        if len(compressed) < len(data):
+            path.with_name(path.name + suffix).write_bytes(compressed)
+
+
+def build(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR) -> dict:
+    dist_dir.mkdir(parents=True, exist_ok=True)
+    for old in dist_dir.iterdir():
+        old.unlink()
+
+    assets = {}
+    for source in sorted(static_dir.iterdir()):
+        if source.suffix not in ASSET_SUFFIXES:
+            continue
+        data = source.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed_name = f"{source.stem}.{digest}{source.suffix}"
+        _writeVariants(dist_dir / hashed_name, data)
+        assets[source.name] = hashed_name
+
+    pages = []
+    for source in sorted(static_dir.glob("*.html")):
+        html = source.read_text(encoding="utf-8")
+        for name, hashed_name in assets.items():
+            html = html.replace(f"/static/{name}", f"{ASSET_URL_PREFIX}{hashed_name}")
+        _writeVariants(dist_dir / source.name, html.encode("utf-8"))
+        pages.append(source.name)
+
+    manifest = {"assets": assets, "pages": pages}
+    (dist_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def _pickEncoding(request: Request, variants: dict) -> str:
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+class AssetTable:
+    """In-memory table of built assets and pages with their precompressed variants."""
+
+    def __init__(self):
+        self._files: dict[str, dict] = {}
+
+    def load(self, dist_dir: Path = DIST_DIR):
+        files = {}
+        manifest_path = dist_dir / "manifest.json"
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text())
+            for name in list(manifest["assets"].values()) + manifest["pages"]:
+                path = dist_dir / name
+                data = path.read_bytes()
+                variants = {"identity": data}
+                for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+                    compressed = path.with_name(name + suffix)
+                    if compressed.exists():
+                        variants[encoding] = compressed.read_bytes()
+                files[name] = {
+                    "variants": variants,
+                    "media_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+                    "digest": hashlib.sha256(data).hexdigest()[:20],
+                }
+        self._files = files
+
+    def _respond(self, request: Request, name: str, cache_control: str) -> Response | None:
+        entry = self._files.get(name)
+        if entry is None:
+            return None
+        encoding = _pickEncoding(request, entry["variants"])
+        # each content-coding is its own representation, so each gets its own strong validator
+        etag = f'"{entry["digest"]}"' if encoding == "identity" else f'"{entry["digest"]}-{encoding}"'
+        headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding", "ETag": etag}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(entry["variants"][encoding], media_type=entry["media_type"], headers=headers)
+
+    def asset(self, request: Request, name: str) -> Response:
+        response = self._respond(request, name, IMMUTABLE) if name.endswith(ASSET_SUFFIXES) else None
+        if response is None:
+            raise HTTPException(status_code=404, detail="Asset not found")
+        return response
+
+    def page(self, request: Request, name: str) -> Response:
+        response = self._respond(request, name, "no-cache")
+        if response is None:
+            return FileResponse(STATIC_DIR / name)
+        return response
+
+
+assets = AssetTable()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets into static/dist.")
+    parser.parse_args()
+    result = build()
+    print(f"Built {len(result['assets'])} assets and {len(result['pages'])} pages into {DIST_DIR}")
@@ -0,0 +1,23 @@
+import asyncio
+import logging
+from config import Config
+from core.database.db import acquireLock
+from core.database.reqs_db import expireDueRequests, recoverStaleProcessing
+
+logger = logging.getLogger("raxwallet.payments")
+
+
+async def runExpirySweeper(interval: float = None, batch_size: int = None):
+    interval = interval or Config.REQUEST_SWEEP_INTERVAL_SECONDS
+    batch_size = batch_size or Config.REQUEST_SWEEP_BATCH_SIZE
+    while True:
+        try:
+            if await acquireLock("expiry_sweeper", interval):
+                await expireDueRequests(batch_size)
+                recovered = await recoverStaleProcessing(Config.REQUEST_PROCESSING_TIMEOUT_SECONDS, batch_size)
+                if recovered["review"]:
+                    logger.warning("Payment requests need review (no ledger entry after processing timed out): %s",
+                                   ", ".join(recovered["review"]))
+        except Exception:
+            logger.exception("Error expiring payment requests")
+        await asyncio.sleep(interval)
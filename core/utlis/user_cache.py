@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from config import Config
+from core.models.models import UserInDB
+
+
+class UserCache:
+    """Per-process TTL/LRU cache of authenticated users keyed by token subject (username).
+
+    Writes that change a user call invalidate(); listeners registered with
+    add_invalidation_listener() receive the username so another worker can be
+    told to drop its copy (the receiving side calls invalidate(..., propagate=False)).
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, UserInDB]] = OrderedDict()
+        self._by_wallet: dict[str, str] = {}
+        self._by_id: dict[str, str] = {}
+        self._listeners: list[Callable[[str], None]] = []
+
+    def get(self, username: str) -> Optional[UserInDB]:
+        entry = self._entries.get(username)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            self._drop(username)
+            return None
+        self._entries.move_to_end(username)
+        return user
+
+    def set(self, user: UserInDB):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._drop(user.username)
+        self._entries[user.username] = (time.monotonic() + self.ttl, user)
+        self._by_wallet[user.wallet_id] = user.username
+        self._by_id[user.id] = user.username
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, username: str = None, wallet_id: str = None, user_id: str = None, propagate: bool = True):
+        if username is None and wallet_id is not None:
+            username = self._by_wallet.get(wallet_id)
+        if username is None and user_id is not None:
+            username = self._by_id.get(user_id)
+        if username is None:
+            return
+        self._drop(username)
+        if propagate:
+            for listener in self._listeners:
+                listener(username)
+
+    def add_invalidation_listener(self, listener: Callable[[str], None]):
+        self._listeners.append(listener)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_wallet.clear()
+        self._by_id.clear()
+
+    def _drop(self, username: str):
+        entry = self._entries.pop(username, None)
+        if entry is None:
+            return
+        user = entry[1]
+        if self._by_wallet.get(user.wallet_id) == username:
+            del self._by_wallet[user.wallet_id]
+        if self._by_id.get(user.id) == username:
+            del self._by_id[user.id]
+
+
+user_cache = UserCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL_SECONDS)
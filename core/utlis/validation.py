@@ -1,3 +1,6 @@
+from datetime import datetime, timezone
+
+
 def validate_amount(amount) -> tuple[bool, dict]:
     try:
         amount = float(amount)
@@ -43,3 +46,16 @@ async def validatePass(password):
     if not has_special:
         return False, {"reason": "special", "message": "Password must contain at least one special character: " + special_chars}
     return True, {"reason": "valid", "message": "Password is valid."}
+
+
+def iso_param(value: str | None, name: str) -> str | None:
+    """Parse an ISO 8601 query parameter to a UTC isoformat string (naive means UTC); ValueError when it does not parse."""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 datetime")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
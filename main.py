@@ -1,30 +1,53 @@
-from contextlib import asynccontextmanager
+import argparse
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
-from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
+from api.analytics import analytics_router
 from api.auth import router as auth_router
 from api.payments import pay_router
 from api.users import user_router
 from api.wallet import wallet_router
-from core.database.db import initDB, get_client
-from core.database.user_db import create_indexes
-from core.utlis.limiter import limiter
+from config import Config
+from core.database.db import initDB, get_client, acquireLock, releaseLock, pool_stats, get_pool_stats
+from core.database.indexes import create_indexes
+from core.utlis.limiter import limiter, rate_limit_exceeded_handler
+from core.utlis.metrics import MetricsMiddleware, RuntimeCollector, metrics_response, monitorLoopLag, register_runtime_collector
+from core.utlis.profiling import RequestTimingMiddleware
+from core.utlis.security import password_pool_stats
+from core.utlis.sweeper import runExpirySweeper
+from core.utlis.static_assets import assets
+from core.utlis.responses import JSONResponse
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    assets.load()
     await initDB()
-    await create_indexes()
+    app.state.mongo_pool = pool_stats
+    # The lease only keeps workers that start together from building at once; it is released
+    # straight away so the next restart or reload diffs the registry again.
+    if await acquireLock("create_indexes", Config.STARTUP_LOCK_SECONDS):
+        try:
+            await create_indexes()
+        finally:
+            await releaseLock("create_indexes")
+    tasks = [asyncio.create_task(runExpirySweeper()), asyncio.create_task(monitorLoopLag())]
     yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
     client = get_client()
     if client is not None:
         client.close()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
+register_runtime_collector(RuntimeCollector(get_pool_stats, password_pool_stats))
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +56,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestTimingMiddleware)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -40,47 +65,89 @@ app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(wallet_router)
 app.include_router(pay_router)
+app.include_router(analytics_router)
 
 
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    return metrics_response(request)
+
+@app.get("/assets/{name}")
+async def static_asset(request: Request, name: str):
+    return assets.asset(request, name)
 
 @app.get("/")
-async def root_page():
-    return FileResponse("static/index.html")
+async def root_page(request: Request):
+    return assets.page(request, "index.html")
 
 @app.get("/features")
-async def features_page():
-    return FileResponse("static/features.html")
+async def features_page(request: Request):
+    return assets.page(request, "features.html")
 
 @app.get("/login")
-async def login_page():
-    return FileResponse("static/login.html")
+async def login_page(request: Request):
+    return assets.page(request, "login.html")
 
 @app.get("/register")
-async def register_page():
-    return FileResponse("static/register.html")
+async def register_page(request: Request):
+    return assets.page(request, "register.html")
 
 @app.get("/dashboard")
-async def dashboard_page():
-    return FileResponse("static/dashboard.html")
+async def dashboard_page(request: Request):
+    return assets.page(request, "dashboard.html")
 
 @app.get("/profile")
-async def profile_page():
-    return FileResponse("static/profile.html")
+async def profile_page(request: Request):
+    return assets.page(request, "profile.html")
 
 @app.get("/payment-confirmation")
-async def payment_confirmation_page():
-    return FileResponse("static/payment-confirmation.html")
+async def payment_confirmation_page(request: Request):
+    return assets.page(request, "payment-confirmation.html")
 
 @app.get("/qr-payment-generator")
-async def qr_payment_generator_page():
-    return FileResponse("static/qr-payment-generator.html")
+async def qr_payment_generator_page(request: Request):
+    return assets.page(request, "qr-payment-generator.html")
 
 @app.get("/payment-received")
-async def payment_received_page():
-    return FileResponse("static/payment-received.html")
+async def payment_received_page(request: Request):
+    return assets.page(request, "payment-received.html")
+
+
+def run_production(args):
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        uds=args.uds,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        reload=False
+    )
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="localhost", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Run the RaxWallet API.")
+    parser.add_argument("--prod", action="store_true", help="multi-worker production mode without the reloader")
+    parser.add_argument("--host", default=Config.HOST)
+    parser.add_argument("--port", type=int, default=Config.PORT)
+    parser.add_argument("--uds", default=Config.UDS, help="bind to a unix domain socket instead of host/port")
+    parser.add_argument("--workers", type=int, default=Config.WEB_CONCURRENCY)
+    parser.add_argument("--loop", default=Config.UVICORN_LOOP, choices=["auto", "asyncio", "uvloop"])
+    parser.add_argument("--http", default=Config.UVICORN_HTTP, choices=["auto", "h11", "httptools"])
+    parser.add_argument("--keep-alive", type=int, default=Config.KEEP_ALIVE_SECONDS)
+    parser.add_argument("--backlog", type=int, default=Config.BACKLOG)
+    parser.add_argument("--graceful-timeout", type=int, default=Config.GRACEFUL_SHUTDOWN_SECONDS)
+    args = parser.parse_args()
+
+    if args.prod:
+        run_production(args)
+    else:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
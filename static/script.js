@@ -276,7 +276,7 @@ async function loadTransactions() {
   const emptyHint = document.getElementById('tx-empty');
   if (!txList) return;
   try {
-    const res = await fetch(`${API_BASE_URL}/wallet/transactions`, { headers: { 'Authorization': `Bearer ${authToken}` } });
+    const res = await fetch(`${API_BASE_URL}/wallet/transactions?limit=50`, { headers: { 'Authorization': `Bearer ${authToken}` } });
     if (!res.ok) 
       throw new Error('tx fetch failed');
     const data = await res.json();
@@ -795,7 +795,7 @@ async function handleQRGeneration(e) {
 }
 
 let statusPollingInterval = null;
-let paymentTimeoutId = null;
+let statusEventSource = null;
 
 function displayQRResult(qrData, description, expires_in_minutes) {
   const qrResult = document.getElementById('qrResult');
@@ -929,37 +929,69 @@ function getStatusDisplayText(status) {
   }
 }
 
-function startStatusPolling(requestId) {
+function stopStatusUpdates() {
+  if (statusEventSource) {
+    statusEventSource.close();
+    statusEventSource = null;
+  }
+
   if (statusPollingInterval) {
     clearInterval(statusPollingInterval);
+    statusPollingInterval = null;
   }
+}
 
-  if (paymentTimeoutId) {
-    clearTimeout(paymentTimeoutId);
+function handleRequestStatus(statusData) {
+  const currentStatus = statusData.status;
+  if (currentStatus === 'pending' || currentStatus === 'processing') {
+    return;
   }
 
-  // Set up 3-minute (180 seconds) timeout to automatically expire the transaction
-  paymentTimeoutId = setTimeout(async () => {
-    if (statusPollingInterval) {
-      clearInterval(statusPollingInterval);
-      statusPollingInterval = null;
-    }
+  stopStatusUpdates();
 
-    // Automatically expire the transaction after 3 minutes
-    try {
-      await fetch(`${API_BASE_URL}/payments/expire_request/${requestId}`, {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${authToken}`
-        }
-      });
-    } catch (error) {
-      console.error('Error expiring transaction:', error);
+  if (currentStatus === 'completed') {
+    updatePaymentStatus('completed', 'Payment completed successfully!', statusData.sender_name);
+    showToast('Payment received successfully!', 'success');
+
+    if (typeof loadWalletBalance === 'function') {
+      loadWalletBalance();
     }
 
-    updatePaymentStatus('expired', 'Payment request expired after 3 minutes.');
-    showToast('Payment request expired due to timeout', 'warning');
-  }, 180000); // 3 minutes = 180,000 milliseconds
+
+    setTimeout(() => {
+      const amount = window.currentQRData.amount;
+      const sender = encodeURIComponent(statusData.sender_name || 'Unknown');
+      const txId = window.currentQRData.request_id;
+      const description = encodeURIComponent(window.currentQRData.description || '');
+
+      window.location.href = `/payment-received?amount=${amount}&sender=${sender}&tx_id=${txId}&description=${description}`;
+    }, 2000);
+  } else if (currentStatus === 'rejected') {
+    updatePaymentStatus('rejected', 'Payment was declined by the sender.');
+    showToast('Payment request was declined', 'error');
+  } else if (currentStatus === 'failed') {
+    updatePaymentStatus('failed', 'Payment failed due to an error.');
+    showToast('Payment failed', 'error');
+  } else if (currentStatus === 'cancelled') {
+    updatePaymentStatus('cancelled', 'Payment request was cancelled.');
+    showToast('Payment request cancelled', 'warning');
+  } else if (currentStatus === 'expired') {
+    updatePaymentStatus('expired', 'Payment request has expired.');
+    showToast('Payment request expired', 'warning');
+  }
+}
+
+function startStatusPolling(requestId) {
+  stopStatusUpdates();
+
+  // The server pushes status changes; EventSource reconnects on its own after network errors.
+  if (window.EventSource) {
+    statusEventSource = new EventSource(`${API_BASE_URL}/payments/request_events/${requestId}`);
+    statusEventSource.addEventListener('status', (event) => {
+      handleRequestStatus(JSON.parse(event.data));
+    });
+    return;
+  }
 
   statusPollingInterval = setInterval(async () => {
     try {
@@ -970,50 +1002,7 @@ function startStatusPolling(requestId) {
       });
 
       if (response.ok) {
-        const statusData = await response.json();
-        const currentStatus = statusData.status;
-
-        if (currentStatus !== 'pending') {
-          clearInterval(statusPollingInterval);
-          statusPollingInterval = null;
-
-          // Clear the timeout since transaction completed
-          if (paymentTimeoutId) {
-            clearTimeout(paymentTimeoutId);
-            paymentTimeoutId = null;
-          }
-
-          if (currentStatus === 'completed') {
-            updatePaymentStatus('completed', 'Payment completed successfully!', statusData.sender_name);
-            showToast('Payment received successfully!', 'success');
-
-            if (typeof loadWalletBalance === 'function') {
-              loadWalletBalance();
-            }
-
-
-            setTimeout(() => {
-              const amount = window.currentQRData.amount;
-              const sender = encodeURIComponent(statusData.sender_name || 'Unknown');
-              const txId = window.currentQRData.request_id;
-              const description = encodeURIComponent(window.currentQRData.description || '');
-
-              window.location.href = `/payment-received?amount=${amount}&sender=${sender}&tx_id=${txId}&description=${description}`;
-            }, 2000);
-          } else if (currentStatus === 'rejected') {
-            updatePaymentStatus('rejected', 'Payment was declined by the sender.');
-            showToast('Payment request was declined', 'error');
-          } else if (currentStatus === 'failed') {
-            updatePaymentStatus('failed', 'Payment failed due to an error.');
-            showToast('Payment failed', 'error');
-          } else if (currentStatus === 'cancelled') {
-            updatePaymentStatus('cancelled', 'Payment request was cancelled.');
-            showToast('Payment request cancelled', 'warning');
-          } else if (currentStatus === 'expired') {
-            updatePaymentStatus('expired', 'Payment request has expired.');
-            showToast('Payment request expired', 'warning');
-          }
-        }
+        handleRequestStatus(await response.json());
       }
     } catch (error) {
       console.error('Status polling error:', error);
@@ -1025,15 +1014,7 @@ function resetQRForm() {
   const qrResult = document.getElementById('qrResult');
   const qrForm = document.getElementById('qrForm');
 
-  if (statusPollingInterval) {
-    clearInterval(statusPollingInterval);
-    statusPollingInterval = null;
-  }
-
-  if (paymentTimeoutId) {
-    clearTimeout(paymentTimeoutId);
-    paymentTimeoutId = null;
-  }
+  stopStatusUpdates();
 
   if (qrResult) qrResult.style.display = 'none';
   if (qrForm) {
@@ -1505,15 +1486,7 @@ async function cancelPaymentRequest() {
     }
 
 
-    if (statusPollingInterval) {
-      clearInterval(statusPollingInterval);
-      statusPollingInterval = null;
-    }
-
-    if (paymentTimeoutId) {
-      clearTimeout(paymentTimeoutId);
-      paymentTimeoutId = null;
-    }
+    stopStatusUpdates();
 
     updatePaymentStatus('cancelled', 'Payment request cancelled by user.');
     showToast('Payment request cancelled successfully', 'success');
@@ -0,0 +1,90 @@
+import asyncio
+import math
+import os
+import pytest
+from config import Config
+import core.database.db as database
+from core.database.transaction_db import _planBatch, applyBalanceChange, listTransactions, sendMoneyBatch
+
+TIMESTAMP = "2026-01-01T00:00:00+00:00"
+REPLICA_URI = os.getenv("RAXWALLET_TEST_REPLICA_URI")
+
+
+def _recipients(*wallet_ids: str, balance: float = 0.0) -> dict:
+    return {wallet_id: {"wallet_id": wallet_id, "balance": balance} for wallet_id in wallet_ids}
+
+
+def test_plan_batch_evaluates_items_in_order_against_running_balance():
+    transfers = [
+        {"to_wallet_id": "bbb", "amount": 60.0},
+        {"to_wallet_id": "ccc", "amount": 50.0},
+        {"to_wallet_id": "ccc", "amount": 40.0},
+    ]
+    results, ledger, credits, balance = _planBatch("aaa", 100.0, _recipients("bbb", "ccc"), transfers, TIMESTAMP)
+
+    assert [r["status"] for r in results] == ["ok", "insufficient_funds", "ok"]
+    assert balance == 0.0
+    assert credits == {"bbb": {"amount": 60.0, "count": 1}, "ccc": {"amount": 40.0, "count": 1}}
+    assert [(e["wallet_id"], e["type"], e["amount"], e["balance_after"]) for e in ledger] == [
+        ("aaa", "debit", -60.0, 40.0),
+        ("bbb", "credit", 60.0, 60.0),
+        ("aaa", "debit", -40.0, 0.0),
+        ("ccc", "credit", 40.0, 40.0),
+    ]
+    assert ledger[0]["id"] == ledger[1]["id"] == results[0]["transaction_id"]
+
+
+@pytest.mark.parametrize("amount", [0.0, -5.0, math.nan, math.inf])
+def test_plan_batch_rejects_invalid_amounts(amount):
+    results, ledger, credits, balance = _planBatch("aaa", 100.0, _recipients("bbb"), [{"to_wallet_id": "bbb", "amount": amount}], TIMESTAMP)
+
+    assert results[0]["status"] == "invalid_amount"
+    assert ledger == [] and credits == {} and balance == 100.0
+
+
+def test_plan_batch_rejects_self_and_unknown_recipients():
+    transfers = [{"to_wallet_id": "aaa", "amount": 1.0}, {"to_wallet_id": "zzz", "amount": 1.0}]
+    results, ledger, _, _ = _planBatch("aaa", 100.0, _recipients("bbb"), transfers, TIMESTAMP)
+
+    assert [r["status"] for r in results] == ["invalid_recipient", "recipient_not_found"]
+    assert ledger == []
+
+
+def test_plan_batch_accumulates_repeated_recipient_balance():
+    transfers = [{"to_wallet_id": "bbb", "amount": 10.0}, {"to_wallet_id": "bbb", "amount": 15.0}]
+    _, ledger, credits, _ = _planBatch("aaa", 100.0, _recipients("bbb", balance=5.0), transfers, TIMESTAMP)
+
+    assert [e["balance_after"] for e in ledger if e["wallet_id"] == "bbb"] == [15.0, 30.0]
+    assert credits["bbb"] == {"amount": 25.0, "count": 2}
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not REPLICA_URI, reason="set RAXWALLET_TEST_REPLICA_URI to a replica-set mongod to run")
+async def test_send_batch_survives_concurrent_sender_updates():
+    Config.mongo_uri = REPLICA_URI
+    Config.mongo_db = f"raxwallet_test_{os.getpid()}"
+    Config.secret_key = Config.secret_key or "test"
+    await database.initDB()
+    db = database.get_db()
+    try:
+        await db.users.insert_many([
+            {"wallet_id": wallet_id, "username": wallet_id, "full_name": wallet_id, "balance": balance, "transactions_count": 0}
+            for wallet_id, balance in (("aaa", 100.0), ("bbb", 0.0), ("ccc", 0.0))
+        ])
+        transfers = [{"to_wallet_id": "bbb", "amount": 30.0}, {"to_wallet_id": "ccc", "amount": 20.0}]
+        # add_funds updates the sender outside any transaction, which is what makes the batch hit WriteConflict
+        outcome, *_ = await asyncio.gather(
+            sendMoneyBatch("aaa", transfers),
+            *(applyBalanceChange("aaa", 1.0, "credit") for _ in range(20))
+        )
+        _, results = outcome
+
+        assert [r["status"] for r in results] == ["ok", "ok"]
+        balances = {doc["wallet_id"]: doc["balance"] async for doc in db.users.find({}, {"wallet_id": 1, "balance": 1})}
+        assert balances == {"aaa": 70.0, "bbb": 30.0, "ccc": 20.0}
+        debits, _ = await listTransactions("aaa", tx_type="debit")
+        assert sorted(tx["amount"] for tx in debits) == [-30.0, -20.0]
+    finally:
+        client = database.get_client()
+        await client.drop_database(Config.mongo_db)
+        client.close()
@@ -0,0 +1,42 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+import core.database.db as database
+from core.database.transaction_db import applyBalanceChange, transferFunds
+from core.utlis.error import ValidationError
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, "db", AsyncMongoMockClient()["raxwallet_test"])
+    return database.db
+
+
+async def _user(db, wallet_id: str, balance: float):
+    await db.users.insert_one({"wallet_id": wallet_id, "username": wallet_id, "full_name": wallet_id,
+                               "balance": balance, "transactions_count": 0})
+
+
+@pytest.mark.asyncio
+async def test_transfer_to_own_wallet_is_rejected_before_any_write(db):
+    await _user(db, "aaa", 100.0)
+
+    with pytest.raises(ValidationError):
+        await transferFunds("aaa", "aaa", 10.0)
+
+    user = await db.users.find_one({"wallet_id": "aaa"})
+    assert (user["balance"], user["transactions_count"]) == (100.0, 0)
+    assert await db.ledger.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_balance_change_survives_a_failed_ledger_insert(db, monkeypatch):
+    await _user(db, "aaa", 0.0)
+
+    async def failingInsert(*args, **kwargs):
+        raise RuntimeError("ledger unavailable")
+    monkeypatch.setattr(type(db.ledger), "insert_many", failingInsert)
+
+    user = await applyBalanceChange("aaa", 25.0, "credit")
+
+    assert user["balance"] == 25.0
+    assert (await db.users.find_one({"wallet_id": "aaa"}))["balance"] == 25.0